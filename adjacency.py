@@ -0,0 +1,179 @@
+#adjacency.py
+import os
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+import networkx as nx
+
+class Adjacency(object):
+  # compact adjacency (CSR) representation of an undirected graph
+  # nodes holds the node ids in ascending order, the position of a node in this array is its dense index
+  # the neighbors of the node at position i are indices[indptr[i]:indptr[i+1]], given as positions in ascending order
+  # like in networkx, a self loop shows up once in the neighbors of its node and counts twice for its degree
+
+  def __init__(self, nodes, indptr, indices):
+    self.nodes    = nodes
+    self.indptr   = indptr
+    self.indices  = indices
+
+    # directory the arrays were saved to, see parallel.WorkerPool.share
+    self.path     = None
+
+    # in low memory mode, neighbor lists and sets are read from the arrays on access instead of being built for all nodes
+    self.low_memory = False
+
+  @property
+  def position(self):
+    # mapping of node ids to dense positions, built on first access
+    if not hasattr(self, '_position'):
+      self._position = dict(zip(self.nodes.tolist(), range(len(self.nodes))))
+    return self._position
+
+  @classmethod
+  def from_graph(cls, graph):
+    nodes    = np.array(sorted(graph.nodes()), dtype=np.int64)
+    position = dict(zip(nodes.tolist(), range(len(nodes))))
+
+    indptr   = np.zeros(len(nodes) + 1, dtype=np.int64)
+    indices  = []
+    for i, node in enumerate(nodes.tolist()):
+      neighbor_positions = sorted(position[neighbor] for neighbor in graph.neighbors(node))
+      indices.extend(neighbor_positions)
+      indptr[i + 1] = len(indices)
+
+    return cls(nodes, indptr, np.array(indices, dtype=np.int64))
+
+  @classmethod
+  def from_edges(cls, edges):
+    # builds the adjacency directly from an array with one (source, target) row per edge
+    # duplicate edges are merged, self loops are kept once
+    nodes   = np.unique(edges)
+    n       = len(nodes)
+    sources = np.searchsorted(nodes, edges[:, 0])
+    targets = np.searchsorted(nodes, edges[:, 1])
+
+    # both directions of every edge, sorted by source and target position and without duplicates
+    loops   = sources == targets
+    keys    = np.unique(np.concatenate((sources * n + targets, targets[~loops] * n + sources[~loops])))
+    rows    = keys // n
+
+    indptr  = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return cls(nodes.astype(np.int64), indptr, (keys % n).astype(np.int64))
+
+  def with_changes(self, added, removed):
+    # new adjacency with the removed edges deleted and then the added edges inserted, both given as arrays
+    # with one (source, target) row of node ids per edge; nodes left without any edge are dropped
+    edges = self.edges()
+    if len(removed):
+      ids      = np.union1d(self.nodes, np.asarray(removed).ravel())
+      keys     = edge_keys(ids, edges)
+      removed  = edge_keys(ids, np.sort(np.asarray(removed, dtype=np.int64), axis=1))
+      edges    = edges[~np.in1d(keys, removed)]
+    return Adjacency.from_edges(np.concatenate((edges, np.asarray(added, dtype=np.int64).reshape(-1, 2))))
+
+  @classmethod
+  def load(cls, path, mmap_mode=None):
+    adjacency = cls(*[np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in ('nodes', 'indptr', 'indices')])
+    adjacency.path = path
+    return adjacency
+
+  def save(self, path):
+    for name in ('nodes', 'indptr', 'indices'):
+      np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+    self.path = path
+
+  def fingerprint(self):
+    # sha1 of the node ids and the adjacency structure, identifies the graph independent of the file it was read from
+    if not hasattr(self, '_fingerprint'):
+      digest = hashlib.sha1()
+      for name in ('nodes', 'indptr', 'indices'):
+        digest.update(np.ascontiguousarray(getattr(self, name), dtype=np.int64).tostring())
+      self._fingerprint = digest.hexdigest()
+    return self._fingerprint
+
+  def edges(self):
+    # array with one (source, target) row of node ids per edge, every edge once with source <= target
+    rows = np.repeat(np.arange(len(self.nodes)), np.diff(self.indptr))
+    keep = rows <= self.indices
+    return np.column_stack((self.nodes[rows[keep]], self.nodes[self.indices[keep]]))
+
+  def number_of_nodes(self):
+    return len(self.nodes)
+
+  def neighbors(self, i):
+    return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+  def neighbor_lists(self):
+    # plain python lists of neighbor positions, which are much faster to iterate in pure python loops
+    # built once and kept, as every chunk of work on the graph needs them (except in low memory mode)
+    if self.low_memory:
+      return NeighborView(self.indptr, self.indices)
+    if not hasattr(self, '_neighbor_lists'):
+      indptr  = self.indptr.tolist()
+      indices = self.indices.tolist()
+      self._neighbor_lists = [indices[indptr[i]:indptr[i + 1]] for i in range(len(self.nodes))]
+    return self._neighbor_lists
+
+  def neighbor_sets(self):
+    # neighbor positions as sets without self loops, kept like neighbor_lists
+    if self.low_memory:
+      return NeighborView(self.indptr, self.indices, sets=True)
+    if not hasattr(self, '_neighbor_sets'):
+      self._neighbor_sets = [set(neighbors) - set([i]) for i, neighbors in enumerate(self.neighbor_lists())]
+    return self._neighbor_sets
+
+  def degrees(self):
+    # networkx compatible degrees, self loops count twice, kept like neighbor_lists
+    if not hasattr(self, '_degrees'):
+      rows  = np.repeat(np.arange(len(self.nodes)), np.diff(self.indptr))
+      loops = np.bincount(rows[rows == self.indices], minlength=len(self.nodes))
+      self._degrees = np.diff(self.indptr) + loops
+    return self._degrees
+
+  def matrix(self):
+    # scipy sparse adjacency matrix with a 1.0 for every entry of the neighbor lists
+    if not hasattr(self, '_matrix'):
+      n = len(self.nodes)
+      self._matrix = sp.csr_matrix((np.ones(len(self.indices)), self.indices, self.indptr), shape=(n, n))
+    return self._matrix
+
+  def simple_matrix(self):
+    # adjacency matrix without self loops
+    if not hasattr(self, '_simple_matrix'):
+      matrix = self.matrix() - sp.diags(self.matrix().diagonal(), format='csr')
+      matrix.eliminate_zeros()
+      self._simple_matrix = matrix
+    return self._simple_matrix
+
+  def to_networkx(self):
+    # networkx graph with the same nodes and edges, for metrics which are not implemented on the compact adjacency
+    graph = nx.Graph()
+    graph.add_nodes_from(self.nodes.tolist())
+    rows  = np.repeat(np.arange(len(self.nodes)), np.diff(self.indptr))
+    upper = rows <= self.indices
+    graph.add_edges_from(zip(self.nodes[rows[upper]].tolist(), self.nodes[self.indices[upper]].tolist()))
+    return graph
+
+
+class NeighborView(object):
+  # neighbor lists (or sets without self loops) of single nodes, read from the CSR arrays on every access
+
+  def __init__(self, indptr, indices, sets=False):
+    self.indptr  = indptr
+    self.indices = indices
+    self.sets    = sets
+
+  def __len__(self):
+    return len(self.indptr) - 1
+
+  def __getitem__(self, i):
+    neighbors = self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()
+    if self.sets:
+      return set(neighbors) - set([i])
+    return neighbors
+
+
+def edge_keys(ids, edges):
+  # one integer per (source, target) row of node ids, given the sorted array of all node ids involved
+  return np.searchsorted(ids, edges[:, 0]) * len(ids) + np.searchsorted(ids, edges[:, 1])
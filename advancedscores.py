@@ -4,30 +4,18 @@ import numpy as np
 ################
 #advanced scores
 ################
+# advanced scores take the calculator as their single parameter and return the column of score values
 
 def adv_unified_risk_score(self):
 
-  #caching of all values in dictionaries
-  all_ccs_normalized = dict(self.redis.zrange(self.metric_prefix+'corrected_clustering_coefficient'+self.normalization_suffix, 0, -1, withscores=True, score_cast_func=float))
-  all_urs = dict(self.redis.zrange(self.score_prefix+'unified_risk_score', 0, -1, withscores=True, score_cast_func=float))
+  #columns of the required values
+  all_ccs_normalized = self.columns['corrected_clustering_coefficient'+self.normalization_suffix]
+  all_urs = self.columns['unified_risk_score']
 
-  urs_percentile_10 = np.percentile(all_urs.values(), 10)
-  urs_percentile_90 = np.percentile(all_urs.values(), 90)
+  #exact percentiles of the column in memory, the sketch of the column is only used for its statistics
+  urs_percentile_10, urs_percentile_90 = np.percentile(all_urs, [10, 90])
 
-  for node in self.nodes:
-    cc_normalized = all_ccs_normalized[str(node)]
-    urs = all_urs[str(node)]
-
-
-    if (urs >= urs_percentile_90 or urs <= urs_percentile_10):
-      if (cc_normalized >= 0.25):
-        advanced_unified_risk_score = ((urs * 3.0) + cc_normalized) / 4.0
-      else:
-        advanced_unified_risk_score = urs
-    else:
-      advanced_unified_risk_score = urs
-
-    #save for node  
-    self.redis.hset(self.node_prefix+str(node), 'advanced_unified_risk_score', advanced_unified_risk_score)
-    #save for score
-    self.redis.zadd(self.score_prefix+'advanced_unified_risk_score', advanced_unified_risk_score, str(node))
\ No newline at end of file
+  #nodes with an extreme unified risk score (top or bottom 10%) and a high clustering coefficient
+  #get a quarter of their score from the clustering coefficient, all others keep their unified risk score
+  extreme = (all_urs >= urs_percentile_90) | (all_urs <= urs_percentile_10)
+  return np.where(extreme & (all_ccs_normalized >= 0.25), ((all_urs * 3.0) + all_ccs_normalized) / 4.0, all_urs)
\ No newline at end of file
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+import os
+import json
+import argparse
+import redis as rd
+import config
+from parallel import WorkerPool
+from file_importer import FileImporter
+from metric_calculator import MetricCalculator
+
+# processes a series of graph snapshots (e.g. one Dataset_<year>.txt per year) in one process with one worker pool
+# every snapshot is published below its own namespace snapshot_prefix+<snapshot name>+':', where the snapshot name
+# is the file name without its extensions
+# graphs are read from the graph cache and metrics from their checkpoints where possible (see file_importer.py and
+# checkpoints.py); every snapshot after the first is updated incrementally from the preceding one (see incremental.py),
+# so that only what the changed edges affect is calculated again; the change of every score against the preceding
+# snapshot is published with every snapshot (see temporal.py)
+
+
+def snapshot_name(filename):
+  return os.path.basename(filename).split('.')[0]
+
+
+class Batch(object):
+
+  def __init__(self, filenames, workers=1, redis=None, resume=False, incremental=True):
+    # filenames in the order of the snapshots, incremental=False calculates every snapshot from scratch
+    self.filenames   = filenames
+    self.workers     = workers
+    self.redis       = redis if redis is not None else rd.StrictRedis(host='localhost', port=6379, db=0)
+    self.resume      = resume
+    self.incremental = incremental
+
+    self.snapshot_prefix = config.snapshot_prefix
+
+    # run report of every snapshot, in the order of the snapshots
+    self.reports     = []
+
+  def namespace(self, filename):
+    return self.snapshot_prefix+snapshot_name(filename)+':'
+
+  def start(self):
+    names = [snapshot_name(filename) for filename in self.filenames]
+    if len(set(names)) != len(names):
+      raise ValueError('snapshot names are not unique: %s' % ', '.join(names))
+
+    pool     = WorkerPool(self.workers)
+    previous = None
+    try:
+      for filename in self.filenames:
+        adjacency = FileImporter(filename).read()
+        mc        = MetricCalculator(adjacency, self.workers, self.redis, self.resume, pool, self.namespace(filename))
+        mc.baseline = previous
+        if previous is not None and self.incremental:
+          mc.update(previous)
+        else:
+          mc.start()
+        self.reports.append((snapshot_name(filename), mc.report))
+
+        # only the columns of the latest snapshot are needed for the next one
+        mc.previous = mc.delta = mc.baseline = None
+        previous = mc
+    finally:
+      pool.close()
+
+  def save_report(self, filename):
+    with open(filename, 'w') as report_file:
+      json.dump([dict(report.as_dict(), snapshot=name) for name, report in self.reports], report_file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Calculate metrics, scores and score changes of a series of graph snapshots with one worker pool')
+
+  parser.add_argument('filenames', metavar='filename', type=str, nargs='+',
+                      help='snapshot data files in chronological order, each published below its own namespace')
+
+  parser.add_argument('--workers', dest='workers', type=int, default=1, help='number of worker processes for the graph metrics (default: 1)')
+
+  parser.add_argument('--resume', dest='resume', action='store_true', help='read metrics from the checkpoints of earlier runs on the same graphs')
+
+  parser.add_argument('--full', dest='full', action='store_true', help='calculate every snapshot from scratch instead of updating it from the preceding one')
+
+  parser.add_argument('--report', dest='report', type=str, help='write a json report with timings and resource usage of every snapshot to this file')
+
+  args = parser.parse_args()
+
+  batch = Batch(args.filenames, args.workers, resume=args.resume, incremental=not args.full)
+  batch.start()
+
+  if args.report:
+    batch.save_report(args.report)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+import sys
+import json
+import argparse
+import numpy as np
+import networkx as nx
+import config
+from adjacency import Adjacency
+from file_importer import FileImporter
+from metric_calculator import MetricCalculator
+
+# reproducible benchmarks of all calculation stages (see instrumentation.py) on seeded synthetic graphs and the dataset
+# results are written against an in-memory redis stand-in, so that only the calculation itself is measured
+
+# synthetic graph generators, every generator takes the number of nodes and a seed
+generators = {'ba' : lambda n, seed: nx.barabasi_albert_graph(n, 3, seed=seed),
+              'er' : lambda n, seed: nx.fast_gnp_random_graph(n, 6.0 / n, seed=seed),
+              'plc': lambda n, seed: nx.powerlaw_cluster_graph(n, 3, 0.3, seed=seed)}
+
+scales = {'small' : 1000,
+          'medium': 5000,
+          'large' : 20000}
+
+datasets = {'dataset-2012': 'data/Dataset_2012.txt'}
+
+default_graphs = ['ba-small', 'er-small', 'plc-small', 'ba-medium', 'er-medium', 'plc-medium']
+
+
+class MemoryRedis(object):
+  # minimal redis stand-in, implementing the commands used when publishing results
+
+  def __init__(self):
+    self.data = {}
+
+  def flushdb(self):
+    self.data = {}
+
+  def set(self, key, value):
+    self.data[key] = value
+
+  def pipeline(self, transaction=True):
+    return MemoryPipeline(self)
+
+
+class MemoryPipeline(object):
+
+  def __init__(self, redis):
+    self.redis    = redis
+    self.commands = []
+
+  def hmset(self, key, mapping):
+    self.commands.append(lambda data: data.setdefault(key, {}).update(mapping))
+
+  def zadd(self, key, *args):
+    self.commands.append(lambda data: data.setdefault(key, {}).update(zip(args[1::2], args[0::2])))
+
+  def sadd(self, key, *members):
+    self.commands.append(lambda data: data.setdefault(key, set()).update(members))
+
+  def execute(self):
+    for command in self.commands:
+      command(self.redis.data)
+    self.commands = []
+
+
+def load_graph(name, seed):
+  # graph names are <generator>-<scale> for synthetic graphs or the name of a dataset
+  if name in datasets:
+    return FileImporter(datasets[name]).read()
+
+  generator, scale = name.split('-')
+  graph = generators[generator](scales[scale], seed)
+  return Adjacency.from_edges(np.array(graph.edges(), dtype=np.int64).reshape(-1, 2))
+
+
+def run(name, seed, workers, repeat):
+  # wall time of every stage, the fastest of all repetitions
+  adjacency = load_graph(name, seed)
+  timings   = {}
+  # the stand-in starts empty for every repetition, results are published without versions (see versions.py) and
+  # no checkpoints are written; the metrics run one after another (scheduler_threads 1), otherwise the stages of the
+  # metrics sharing a calculation (e.g. the shortest path sweep) would all include the time spent waiting for it
+  settings = dict((setting, getattr(config, setting)) for setting in ('versioned_publishing', 'store_checkpoints', 'scheduler_threads'))
+  config.versioned_publishing = False
+  config.store_checkpoints    = False
+  config.scheduler_threads    = 1
+  try:
+    for _ in range(repeat):
+      mc = MetricCalculator(adjacency, workers, MemoryRedis())
+      mc.start()
+      for entry in mc.report.stages:
+        timings[entry['stage']] = min(timings.get(entry['stage'], float('inf')), entry['wall_time'])
+  finally:
+    for setting, value in settings.items():
+      setattr(config, setting, value)
+  return {'nodes': adjacency.number_of_nodes(), 'edges': len(adjacency.indices), 'stages': timings}
+
+
+def compare(results, baseline, threshold, min_time):
+  # stages which are more than threshold (relative) slower than in the baseline
+  # stages faster than min_time seconds in the baseline are too noisy to be compared
+  regressions = []
+  for name in results:
+    if name not in baseline:
+      continue
+    for stage, wall_time in results[name]['stages'].items():
+      previous = baseline[name]['stages'].get(stage)
+      if previous is None or previous < min_time:
+        continue
+      if wall_time > previous * (1.0 + threshold):
+        regressions.append((name, stage, previous, wall_time))
+  return regressions
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark all calculation stages on synthetic graphs and datasets')
+
+  parser.add_argument('--graphs', dest='graphs', type=str, default=','.join(default_graphs),
+                      help='comma separated graph names: <ba|er|plc>-<small|medium|large> or dataset-2012')
+  parser.add_argument('--seed', dest='seed', type=int, default=42, help='seed of the synthetic graph generators')
+  parser.add_argument('--workers', dest='workers', type=int, default=1, help='number of worker processes')
+  parser.add_argument('--repeat', dest='repeat', type=int, default=3, help='repetitions per graph, the fastest counts')
+  parser.add_argument('--output', dest='output', type=str, help='write the results as json to this file')
+  parser.add_argument('--baseline', dest='baseline', type=str, help='compare the results against this result file')
+  parser.add_argument('--threshold', dest='threshold', type=float, default=0.2,
+                      help='relative slowdown which counts as a regression (default: 0.2)')
+  parser.add_argument('--min-time', dest='min_time', type=float, default=0.05,
+                      help='stages below this many seconds in the baseline are not compared (default: 0.05)')
+
+  args = parser.parse_args()
+
+  results = {}
+  for name in args.graphs.split(','):
+    results[name] = run(name, args.seed, args.workers, args.repeat)
+    print('%s (%d nodes, %d edges)' % (name, results[name]['nodes'], results[name]['edges'] // 2))
+    for stage, wall_time in sorted(results[name]['stages'].items()):
+      print('  %-70s %10.4fs' % (stage, wall_time))
+
+  if args.output:
+    with open(args.output, 'w') as output_file:
+      json.dump(results, output_file, indent=2, sort_keys=True)
+
+  if args.baseline:
+    with open(args.baseline) as baseline_file:
+      regressions = compare(results, json.load(baseline_file), args.threshold, args.min_time)
+    for name, stage, previous, wall_time in regressions:
+      print('REGRESSION %s %s: %.4fs -> %.4fs (%+.0f%%)' % (name, stage, previous, wall_time, (wall_time / previous - 1.0) * 100))
+    if regressions:
+      sys.exit(1)
@@ -0,0 +1,42 @@
+#checkpoints.py
+import os
+import json
+import tempfile
+import numpy as np
+
+class Checkpoints(object):
+  # on-disk cache of metric columns, one .npy file per checkpoint key (see MetricCalculator.checkpoint_key)
+  # together with a .json file holding the redis hashes the metric wrote besides its column,
+  # e.g. the sampling information of approximated betweenness centralities
+
+  def __init__(self, directory):
+    self.directory = directory
+
+  def load(self, key):
+    # column and hashes of the checkpoint, None if there is no checkpoint for the key
+    path = os.path.join(self.directory, key)
+    if not os.path.isfile(path + '.npy'):
+      return None
+    with open(path + '.json') as hashes_file:
+      hashes = json.load(hashes_file)
+    return np.load(path + '.npy'), hashes
+
+  def save(self, key, values, hashes):
+    # both files are written under temporary names and then moved into place, the column last,
+    # so that a checkpoint is only visible once it is complete
+    if not os.path.isdir(self.directory):
+      try:
+        os.makedirs(self.directory)
+      except OSError:
+        # created by a concurrent save in the meantime
+        pass
+
+    path = os.path.join(self.directory, key)
+    self.write(path + '.json', lambda checkpoint_file: json.dump(hashes, checkpoint_file, default=lambda value: value.item()))
+    self.write(path + '.npy', lambda checkpoint_file: np.save(checkpoint_file, values))
+
+  def write(self, filename, write):
+    handle, temporary = tempfile.mkstemp(dir=self.directory)
+    with os.fdopen(handle, 'wb') as checkpoint_file:
+      write(checkpoint_file)
+    os.rename(temporary, filename)
@@ -0,0 +1,99 @@
+#column_store.py
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+import config
+import sketches
+
+class ColumnStore(object):
+  # in-memory store for all values calculated by the MetricCalculator
+  # every metric, normalized metric and score is one float64 column with one value per node,
+  # indexed by the dense position of the node (the order of MetricCalculator.nodes)
+  # with a memory_budget (in bytes), columns are kept in memory until they take up the budget, later columns are
+  # spilled to memory mapped files in a temporary directory below spill_directory, which close removes
+  # the summary of a column (see sketches.py) is calculated as the column is stored, while its values are still in
+  # memory (before it may be spilled), and kept until the column is replaced; with summarize=False (columns which are
+  # only read, like the inputs of rescore.py) it is calculated on first use instead
+
+  def __init__(self, size, memory_budget=None, spill_directory=None, summarize=True):
+    self.size    = size
+    self.columns = {}
+    self.order   = []
+
+    self.memory_budget   = memory_budget
+    self.spill_directory = spill_directory
+    self.directory       = None
+    self.spilled         = set()
+    self.summaries       = {}
+    self.lock            = threading.Lock()
+
+    self.summarize         = summarize
+    self.relative_accuracy = config.sketch_relative_accuracy
+    self.chunk_size        = config.statistics_chunk_size
+
+  def __setitem__(self, name, values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape != (self.size,):
+      raise ValueError('column %s has shape %s, expected (%d,)' % (name, values.shape, self.size))
+    summary = sketches.summarize(values, self.chunk_size, self.relative_accuracy) if self.summarize else None
+    with self.lock:
+      if name not in self.columns:
+        self.order.append(name)
+      self.spilled.discard(name)
+      self.summaries.pop(name, None)
+      self.columns[name] = None
+      if self.memory_budget is not None and self.resident_bytes() + values.nbytes > self.memory_budget:
+        values = self.spill(name, values)
+      self.columns[name] = values
+      if summary is not None:
+        self.summaries[name] = summary
+
+  def __getitem__(self, name):
+    return self.columns[name]
+
+  def __contains__(self, name):
+    return name in self.columns
+
+  def names(self):
+    # column names in the order the columns were first stored
+    return list(self.order)
+
+  def matrix(self, names):
+    # the given columns side by side, one row per node
+    return np.column_stack([self.columns[name] for name in names])
+
+  def summary(self, name):
+    # without summarize, concurrent first uses may both summarize the column, which gives the same summary
+    values = self.columns[name]
+    if name not in self.summaries:
+      summary = sketches.summarize(values, self.chunk_size, self.relative_accuracy)
+      with self.lock:
+        if self.columns[name] is values:
+          self.summaries[name] = summary
+      return summary
+    return self.summaries[name]
+
+  def resident_bytes(self):
+    return sum(values.nbytes for name, values in self.columns.items() if values is not None and name not in self.spilled)
+
+  def spill(self, name, values):
+    # writes the column to its own file and returns it memory mapped read-only
+    if self.directory is None:
+      if not os.path.isdir(self.spill_directory):
+        os.makedirs(self.spill_directory)
+      self.directory = tempfile.mkdtemp(prefix='columns_', dir=self.spill_directory)
+    path   = os.path.join(self.directory, '%d.npy' % self.order.index(name))
+    mapped = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=values.shape)
+    mapped[:] = values
+    mapped.flush()
+    del mapped
+    self.spilled.add(name)
+    return np.load(path, mmap_mode='r')
+
+  def close(self):
+    # removes the spilled columns; columns still mapped stay readable until they are released
+    if self.directory is not None:
+      shutil.rmtree(self.directory, ignore_errors=True)
+      self.directory = None
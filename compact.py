@@ -0,0 +1,113 @@
+#compact.py
+import numpy as np
+import config
+
+# compact storage layout (storage_layout = 'compact' in config.py)
+# instead of a hash per node, a sorted set per column and a set of neighbors per node, every column and the graph
+# are stored as packed little-endian binary strings indexed by the dense position of a node:
+#   <compact_prefix>nodes            int64 node ids in ascending order, the position of an id is its dense position
+#   <compact_prefix>indptr           int64 CSR row pointers, the neighbors of position i are indices[indptr[i]:indptr[i+1]]
+#   <compact_prefix>indices          int64 CSR neighbor positions
+#   <compact_prefix>column:<name>    compact_dtype value of every node, for every metric, normalized metric and score
+#   <compact_prefix>meta             hash with the layout version, the number of nodes and the column dtype
+# single values are read with GETRANGE (see CompactReader), sorted sets are only kept for the ranked_metrics
+
+layout_version = 1
+
+def keys(prefix):
+  return {'nodes'  : prefix+'nodes',
+          'indptr' : prefix+'indptr',
+          'indices': prefix+'indices',
+          'meta'   : prefix+'meta'}
+
+def column_key(prefix, name):
+  return prefix+'column:'+name
+
+def pack(values, dtype):
+  return np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<')).tostring()
+
+
+def index_graph(self):
+  # node ids and adjacency as packed arrays, replacing the node index and the neighbor sets
+  graph_keys = keys(self.compact_prefix)
+  self.writer.set(graph_keys['nodes'], pack(self.adjacency.nodes, 'i8'))
+  self.writer.set(graph_keys['indptr'], pack(self.adjacency.indptr, 'i8'))
+  self.writer.set(graph_keys['indices'], pack(self.adjacency.indices, 'i8'))
+  self.writer.hset(graph_keys['meta'], 'version', layout_version)
+  self.writer.hset(graph_keys['meta'], 'nodes', len(self.nodes))
+  self.writer.hset(graph_keys['meta'], 'dtype', np.dtype(self.compact_dtype).name)
+
+
+def publish(self, sorted_sets):
+  # one packed string per column and the sorted sets of the ranked metrics, which are replaced as a whole
+  for name in self.columns.names():
+    self.writer.set(column_key(self.compact_prefix, name), pack(self.columns[name], self.compact_dtype))
+    self.writer.flush('publish_results')
+
+  node_ids = [str(node) for node in self.nodes]
+  for name in self.ranked_metrics:
+    if name not in self.columns or name not in sorted_sets:
+      continue
+    self.writer.delete(sorted_sets[name])
+    for value, node in zip(self.columns[name].tolist(), node_ids):
+      self.writer.zadd(sorted_sets[name], value, node)
+    self.writer.flush('publish_results')
+
+
+class CompactReader(object):
+  # accessor for results stored in the compact layout
+  # the node ids are fetched once and kept, every other read only transfers the requested bytes
+
+  def __init__(self, redis, prefix=config.compact_prefix):
+    self.redis  = redis
+    self.prefix = prefix
+    self.keys   = keys(prefix)
+
+    meta = self.redis.hgetall(self.keys['meta'])
+    if not meta:
+      raise ValueError('no results in the compact layout under %s' % prefix)
+    self.dtype = np.dtype(meta['dtype']).newbyteorder('<')
+    self.nodes = np.frombuffer(self.redis.get(self.keys['nodes']), dtype='<i8')
+
+  def position(self, node):
+    position = int(np.searchsorted(self.nodes, node))
+    if position == len(self.nodes) or self.nodes[position] != node:
+      raise KeyError(node)
+    return position
+
+  def value(self, node, name):
+    return self.values(node, [name])[name]
+
+  def values(self, node, names):
+    # values of the given columns for a single node, read with one pipelined GETRANGE per column
+    return self.values_of([node], names)[0]
+
+  def values_of(self, nodes, names):
+    # values of the given columns for every given node as one dict per node, all read in one pipeline
+    positions = [self.position(node) for node in nodes]
+    size      = self.dtype.itemsize
+    pipe      = self.redis.pipeline(transaction=False)
+    for position in positions:
+      for name in names:
+        pipe.getrange(column_key(self.prefix, name), position * size, (position + 1) * size - 1)
+    data = pipe.execute()
+    for name, value in zip(names, data[:len(names)]):
+      if not value:
+        raise KeyError(name)
+    return [dict((name, float(np.frombuffer(data[i * len(names) + j], dtype=self.dtype)[0])) for j, name in enumerate(names)) for i in range(len(positions))]
+
+  def column(self, name):
+    # values of all nodes, ordered like self.nodes
+    data = self.redis.get(column_key(self.prefix, name))
+    if data is None:
+      raise KeyError(name)
+    return np.frombuffer(data, dtype=self.dtype)
+
+  def neighbors(self, node):
+    # node ids of the neighbors, read with two range reads
+    position     = self.position(node)
+    start, stop  = np.frombuffer(self.redis.getrange(self.keys['indptr'], position * 8, position * 8 + 15), dtype='<i8')
+    if stop == start:
+      return []
+    positions    = np.frombuffer(self.redis.getrange(self.keys['indices'], int(start) * 8, int(stop) * 8 - 1), dtype='<i8')
+    return self.nodes[positions].tolist()
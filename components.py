@@ -0,0 +1,76 @@
+#components.py
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+# connected components of the graph for the shortest path engine (see shortest_paths.sweep)
+# eccentricity, distance sum and betweenness centrality only depend on the component of a node; real snapshots consist of
+# one giant component and thousands of small islands, most of which are complete graphs (pairs, triangles) or stars,
+# whose results are known in closed form; only the sources of all other components are searched, largest component first
+
+def label(adjacency):
+  # component label of every node and the size of the component of every node
+  _, labels = connected_components(adjacency.matrix(), directed=False)
+  sizes     = np.bincount(labels)
+  return labels, sizes[labels]
+
+
+def closed_forms(adjacency, labels, sizes):
+  # results of all nodes in complete and star components, without any search
+  # returns a mask of the solved nodes and, for those, eccentricities, distance sums, reached node counts and
+  # unscaled betweenness dependencies (zero for unsolved nodes); self loops do not change any of these results
+  n         = adjacency.number_of_nodes()
+  rows      = np.repeat(np.arange(n), np.diff(adjacency.indptr))
+  degrees   = np.bincount(rows[rows != adjacency.indices], minlength=n)
+  edges     = np.bincount(labels, weights=degrees) / 2
+  k         = sizes.astype(np.float64)
+
+  # a complete component has k(k-1)/2 edges, a star k-1 edges and a center adjacent to all other nodes
+  complete  = edges[labels] == k * (k - 1) / 2
+  center    = (degrees == sizes - 1) & (sizes >= 3)
+  has_center = np.bincount(labels, weights=center, minlength=len(edges)) > 0
+  star      = (edges[labels] == k - 1) & has_center[labels] & ~complete
+  leaf      = star & ~center
+
+  solved        = complete | star
+  reached       = np.where(solved, sizes, 0)
+  eccentricity  = np.where(complete | center, np.minimum(sizes - 1, 1), np.where(leaf, 2, 0))
+  distance_sum  = np.where(complete | center, sizes - 1, np.where(leaf, 2 * sizes - 3, 0))
+  # the center of a star is on the only shortest path between every ordered pair of leaves
+  dependencies  = np.where(star & center, (k - 1) * (k - 2), 0.0)
+
+  return solved, eccentricity, distance_sum, reached, dependencies
+
+
+def search_order(labels, sizes, mask):
+  # positions of the masked nodes, component by component with the largest component first (ties by label),
+  # so that the sources of large components are spread over the worker pool and small ones are batched into few tasks
+  positions = np.flatnonzero(mask)
+  return positions[np.lexsort((positions, labels[positions], -sizes[positions]))]
+
+
+#############
+# distances across components
+#############
+# eccentricity and average shortest path length only measure the component of a node, which makes the nodes of small
+# islands look as central as the best connected nodes of the giant component; distance_normalization selects the rule:
+# - 'component': distances within the component of the node only (eccentricity within the component, average over the
+#   reached nodes including the node itself)
+# - 'wasserman_faust': both values are multiplied by (n - 1) / (r - 1), where r is the size of the component and n the
+#   number of nodes of the graph, like the closeness centrality of Wasserman and Faust; a node of the giant component of
+#   a connected graph keeps its value, nodes of small components get proportionally larger ones and isolated nodes get
+#   the largest value of the column
+# betweenness centralities are always normalized by the number of nodes of the whole graph (see shortest_paths.py)
+
+def normalize_distances(rule, values, reached):
+  if rule == 'component':
+    return values
+  if rule != 'wasserman_faust':
+    raise ValueError('unknown distance normalization %s' % rule)
+
+  n        = len(values)
+  isolated = reached <= 1
+  with np.errstate(invalid='ignore', divide='ignore'):
+    scaled = np.where(isolated, 0.0, values * (float(n - 1) / (reached - 1)))
+  if isolated.any():
+    scaled[isolated] = np.max(scaled)
+  return scaled
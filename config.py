@@ -2,6 +2,7 @@
 import metrics
 import normalizations
 import advancedscores
+import incremental
 
 #redis keys for indexes and values
 node_index_key        = 'all_nodes'
@@ -16,10 +17,116 @@ statistics_prefix     = 'statistics:'
 
 normalization_suffix  = '_normalized'
 
+#storage layout of the published results: 'classic' writes a hash per node, a sorted set per column and a set of
+#neighbors per node; 'compact' writes every column and the adjacency as packed binary strings indexed by dense node
+#position (see compact.py) and keeps sorted sets only for the ranked_metrics (metrics, normalized metrics or scores)
+#compact_dtype is the type of the packed column values, 'float32' halves their size at the cost of precision
+storage_layout        = 'classic'
+compact_prefix        = 'compact:'
+compact_dtype         = 'float64'
+ranked_metrics        = ['unified_risk_score', 'advanced_unified_risk_score']
+
+#versioned publishing (see versions.py): every run writes all the keys above below its own namespace
+#run_namespace_prefix+<run id>+':' instead of flushing the database, the pointer live_run_key is switched to a run
+#once all its results are written; keep_versions earlier versions are kept, older ones and runs which did not publish
+#within abandoned_run_age seconds are deleted in the background with UNLINK
+#without versioned publishing, the database is flushed before every run and results are written in place
+versioned_publishing  = True
+run_namespace_prefix  = 'run:'
+live_run_key          = 'live_run'
+runs_key              = 'runs'
+versions_key          = 'versions'
+keep_versions         = 1
+abandoned_run_age     = 7 * 24 * 3600
+
+#statistics of every column are calculated from a mergeable one-pass summary (see sketches.py and statistics.py) over
+#chunks of statistics_chunk_size values; quantiles (median and statistics_percentiles) have a relative error of at most
+#sketch_relative_accuracy, histograms statistics_histogram_bins bins
+sketch_relative_accuracy  = 0.005
+statistics_chunk_size     = 100000
+statistics_percentiles    = [1, 5, 10, 25, 75, 90, 95, 99]
+statistics_histogram_bins = 20
+
+#batch mode (see batch.py): every snapshot is published below snapshot_prefix+<snapshot name>+':' instead of a versioned
+#namespace; the change of every score against the preceding snapshot is published as the column <score>+delta_suffix,
+#the new and vanished nodes as the sets delta_prefix+'added_nodes' and delta_prefix+'removed_nodes' (see temporal.py)
+snapshot_prefix       = 'snapshot:'
+delta_suffix          = '_delta'
+delta_prefix          = 'delta:'
+
+#the id of the last published run is stored under published_run_key, which clears the caches of the query layer
+#(see query.py); it keeps at most query_cache_size query results and checks for a new run every query_check_interval
+#seconds, its http service listens on query_host:query_port
+published_run_key     = 'published_run'
+query_cache_size      = 10000
+query_check_interval  = 1.0
+query_host            = 'localhost'
+query_port            = 8080
+
+#number of commands per redis pipeline and of members per multi-member ZADD/SADD when results are written in bulk
+redis_batch_size      = 1000
+
+#number of source nodes per task of the shortest path engine and of nodes per task of the neighborhood metrics
+#the chunks do not depend on the number of workers, which keeps results identical for any number of workers
+source_chunk_size     = 256
+node_chunk_size       = 2000
+
+#upper bound for the number of two-hop paths handled by one task of the two-hop neighborhood kernel,
+#which bounds its memory use; nodes with more two-hop paths are processed alone, in groups of neighbors
+two_hop_chunk_entries = 2000000
+
+#low memory mode for graphs whose python neighbor structures do not fit into memory: memory_budget_mb is the memory
+#available to the calculation in megabytes (None disables the mode); in low memory mode
+#- the graph stays in its compact arrays, memory mapped from the graph cache (see file_importer.py)
+#- neighbor lists and sets of single nodes are read from the arrays on access instead of being built for all nodes
+#- clustering coefficients come from sparse products in two-hop chunks instead of python neighbor sets
+#- the sparse products of all workers together are limited to a quarter of the budget (see two_hop_chunk_entries)
+#- columns beyond half of the budget are spilled to memory mapped files below spill_directory
+memory_budget_mb      = None
+spill_directory       = 'cache/spill'
+
+#betweenness centrality is either calculated exactly ('exact') or approximated ('approximate')
+#the approximation samples betweenness_pivots source nodes with a seeded random number generator and scales their
+#dependencies up to all nodes; with a betweenness_target_error, the number of pivots is doubled until the largest
+#estimated standard error of a normalized value is at most the target (or all nodes are pivots)
+#mode, sample size and error estimate of the calculation are stored in the betweenness_sampling_key hash
+betweenness_mode              = 'exact'
+betweenness_pivots            = 1000
+betweenness_seed              = 42
+betweenness_target_error      = None
+betweenness_sampling_key      = statistics_prefix+'betweenness_centrality:sampling'
+
+#rule for eccentricity and average shortest path length of nodes outside the giant component, see components.py:
+#'component' measures distances within the component of a node only,
+#'wasserman_faust' scales them by (n - 1) / (component size - 1), so that small islands do not look central
+distance_normalization        = 'component'
+
+#'sweep' reads eccentricities from the search from every node, which also yields average shortest path lengths and exact
+#betweenness centralities; 'bounding' finds the same exact eccentricities from a few searches (Takes & Kosters, see
+#shortest_paths.py) and stores the number of searches in eccentricity_bounding_key; bounding only saves searches if
+#neither average_shortest_path_length nor betweenness_centrality with betweenness_mode 'exact' is configured, which need
+#the sweep anyway
+eccentricity_method           = 'sweep'
+bounding_min_component_size   = 64
+eccentricity_bounding_key     = statistics_prefix+'eccentricity:bounding'
+
+#imported graphs are cached in binary form in this directory, keyed by the hash of the data file
+#data files are read in chunks of import_chunk_size bytes
+graph_cache_directory = 'cache/graphs'
+import_chunk_size     = 16 * 1024 * 1024
+
+#redis hash which receives the number of redis round trips of every calculation stage
+round_trips_key       = statistics_prefix+'redis_round_trips'
+
+#the run report (timings, memory, redis traffic and throughput of every stage, see instrumentation.py) is stored
+#as json under run_report_prefix+<run id> if store_run_report is enabled
+run_report_prefix     = statistics_prefix+'run:'
+store_run_report      = True
+
 # definition of all base metrics for which absolute values will be calculcated for each node in the first step
 # key is the name of the metric and value is the implemented method which exposes the required interface
-# interface: each method takes the node as the single parameter, performs the necessary calculation and
-# returns a float containing the value for the specified node
+# interface: each method takes the calculator as the single parameter, performs the necessary calculation and
+# returns a numpy array containing the value of every node, ordered like the calculator's nodes
 
 base_metrics  = { 'clustering_coefficient'          : metrics.clustering_coefficient,
                   'degree'                          : metrics.degree,
@@ -33,6 +140,7 @@ base_metrics  = { 'clustering_coefficient'          : metrics.clustering_coeffic
 
 # some metrics might require some corrections or post processing which relies on the value of other metrics or normalizations
 # key is the metric name and value the method for correction
+# interface: same as for base metrics, the values of other metrics are read from the calculator's columns
 
 advanced_metrics = {'corrected_clustering_coefficient'          : metrics.correct_clustering_coefficient,
                     'corrected_average_neighbor_degree'         : metrics.correct_average_neighbor_degree,
@@ -42,11 +150,12 @@ advanced_metrics = {'corrected_clustering_coefficient'          : metrics.correc
 # for every metric, a normalization method has to be specified
 # key is the name of the metric and value is the normalization method which also has to expose the required interface
 # interface: normalization methods, take the name of the (absolute) metric as the single argument, no return value is required
-# the method itself shall access the data which is required for normalization from the redis instance
-# and the corresponding keys/values for the specified metric
-# it shall then loop over all nodes and calculate the normalized value for the node and the metric
-# afterwards it should save the result to redis using "metric_name_normalized" as the key
-# the result is stored inside the node's hash for metrics
+# the method itself shall read the column of the specified metric from the calculator's columns
+# and calculate the normalized values for all nodes
+# afterwards it should store the result as a new column using "metric_name_normalized" as the name
+# all columns are written to the nodes' hashes and the metric sets in redis at the end of the calculation
+# available in normalizations.py: min_max, max_min (for metrics where small values mean high risk), z_score,
+# robust (median and interquartile range), percentile_rank and log_min_max (for heavy-tailed metrics like degree)
 
 # also needs to include corrected metrics with their respective names
 # 
@@ -78,5 +187,55 @@ scores = {'unified_risk_score': { 'degree': 0.25,
 
 # other scores might require a more sophisticated algorithm to be calculated
 # such scores need to be added here and implemented like the example below
+# interface: the method takes the calculator as the single parameter and returns a numpy array with the score of every node
+
+advanced_scores = {'advanced_unified_risk_score': advancedscores.adv_unified_risk_score}
+
+
+# dependencies of metrics, advanced metrics and advanced scores on other results
+# key is the name of the metric or score and value the list of metrics, normalized metrics ("metric_name_normalized")
+# or scores it reads; metrics and scores without an entry only need the graph
+# normalizations depend on their metric and scores on their weighted normalized metrics, which needs no declaration here
+# all calculations run on a pool of scheduler_threads threads, each as soon as its dependencies are available
+
+dependencies = {'corrected_clustering_coefficient'          : ['clustering_coefficient', 'degree'],
+                'corrected_average_neighbor_degree'         : ['average_neighbor_degree'],
+                'corrected_iterated_average_neighbor_degree': ['iterated_average_neighbor_degree'],
+                'advanced_unified_risk_score'               : ['unified_risk_score', 'corrected_clustering_coefficient_normalized']
+               }
+
+scheduler_threads = 4
+
+
+#every calculated metric column is checkpointed to checkpoint_directory if store_checkpoints is enabled
+#a run started with resume (start.py --resume) reads all metrics whose checkpoint is still valid instead of calculating them
+#checkpoints are keyed by the graph, the metric's method and version, its parameters and the keys of its dependencies
+#bump the version of a metric (default: 1) whenever a change to its implementation changes its results
+#metric_parameters lists the configuration variables above which change the results of a metric
+
+checkpoint_directory  = 'cache/checkpoints'
+store_checkpoints     = True
+
+metric_versions       = {}
+
+metric_parameters     = {'betweenness_centrality'      : ['betweenness_mode', 'betweenness_pivots', 'betweenness_seed', 'betweenness_target_error'],
+                         'eccentricity'                : ['distance_normalization', 'eccentricity_method', 'bounding_min_component_size'],
+                         'average_shortest_path_length': ['distance_normalization']}
+
+
+#incremental runs (start.py --added/--removed, see incremental.py) update the metrics of a previously calculated graph
+#key is the name of the metric and value the method which updates it from the previous column
+#interface: same as for base metrics, the calculator additionally holds the previous calculator and the edge delta
+#metrics without an incremental method (cheap vectorized ones such as degree and the corrections) are calculated completely
+#shortest path metrics are calculated completely if more than incremental_source_fraction of all sources are affected
+
+incremental_methods = {'clustering_coefficient'                    : incremental.clustering_coefficient,
+                       'average_neighbor_degree'                   : incremental.average_neighbor_degree,
+                       'iterated_average_neighbor_degree'          : incremental.iterated_average_neighbor_degree,
+                       'corrected_iterated_average_neighbor_degree': incremental.correct_iterated_average_neighbor_degree,
+                       'betweenness_centrality'                    : incremental.betweenness_centrality,
+                       'eccentricity'                              : incremental.eccentricity,
+                       'average_shortest_path_length'              : incremental.average_shortest_path_length
+                      }
 
-advanced_scores = {'advanced_unified_risk_score': advancedscores.adv_unified_risk_score}
\ No newline at end of file
+incremental_source_fraction = 0.5
\ No newline at end of file
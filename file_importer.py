@@ -1,26 +1,123 @@
-import networkx as nx
+import os
+import gzip
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import config
+from adjacency import Adjacency
 
 class FileImporter(object):
 
   def __init__(self,filename):
-    # initialize data file to parse and new empty graph
+    # initialize data file to parse
+    # the file contains one edge per line, the first field specifies the source node, the second the target node
+    # gzip compressed files are detected by their magic number
 
-    self.data_file  = open(filename)
-    self.graph      = nx.Graph()
+    self.filename        = filename
+    self.cache_directory = config.graph_cache_directory
+    self.chunk_size      = config.import_chunk_size
 
   def read(self):
-    for line in self.data_file:
-      self.parse_line(line)
-    return self.graph
+    # the compact adjacency is cached in binary form, keyed by the hash of the data file
+    # a cached graph is memory mapped instead of parsing the file again
+    # in low memory mode, a newly parsed graph is memory mapped from the cache as well, so that its arrays are paged in
+    # and out by the operating system instead of being held in memory
+    cache_path = os.path.join(self.cache_directory, self.fingerprint())
+    if os.path.isdir(cache_path):
+      return Adjacency.load(cache_path, mmap_mode='r')
 
-  def parse_line(self, line):
-    # split each line on tabstop
-    # first field specifies the source node
-    # second field specifies the target node
+    adjacency = Adjacency.from_edges(self.parse())
+    self.save(adjacency, cache_path)
+    if config.memory_budget_mb is not None and adjacency.path is not None:
+      return Adjacency.load(adjacency.path, mmap_mode='r')
+    return adjacency
 
-    fields = line.strip().split("\t")
-    from_node = int(fields[0])
-    to_node = int(fields[1])
+  def fingerprint(self):
+    # sha1 of the raw file content, prefixed with the version of the cache layout
+    digest = hashlib.sha1()
+    with open(self.filename, 'rb') as data_file:
+      for block in iter(lambda: data_file.read(self.chunk_size), b''):
+        digest.update(block)
+    return 'v1-' + digest.hexdigest()
 
-    # add edge to the graph
-    self.graph.add_edge(from_node, to_node)
+  def open(self):
+    with open(self.filename, 'rb') as data_file:
+      magic = data_file.read(2)
+    if magic == b'\x1f\x8b':
+      return gzip.open(self.filename, 'rb')
+    return open(self.filename, 'rb')
+
+  def parse(self):
+    # reads the file in chunks of whole lines and parses every chunk into integers at once
+    # returns an array with one row per edge
+    # every line must have as many fields as the first one: two integer node ids and optionally further numbers,
+    # anything else raises a ValueError naming the line (so that a malformed file is never cached)
+    parts     = []
+    columns   = None
+    remainder = b''
+    line      = 1
+
+    with self.open() as data_file:
+      while True:
+        block = data_file.read(self.chunk_size)
+        text  = remainder + block
+        if not block:
+          remainder = b''
+        else:
+          # keep the incomplete last line for the next chunk
+          end       = text.rfind(b'\n') + 1
+          remainder = text[end:]
+          text      = text[:end]
+
+        if text.strip():
+          if columns is None:
+            columns = len(text.strip().split(b'\n', 1)[0].split())
+          lines  = text.split(b'\n')
+          fields = [len(fields) for fields in (text_line.split() for text_line in lines)]
+          # fromstring stops silently at the first field which is not an integer
+          values = np.fromstring(text, dtype=np.int64, sep=' ')
+          if len(values) == sum(fields) and all(count in (0, columns) for count in fields):
+            # only the first two fields of every line are used
+            parts.append(values.reshape(-1, columns)[:, :2])
+          else:
+            parts.append(self.parse_lines(lines, line, columns))
+        line += text.count(b'\n')
+
+        if not block:
+          break
+
+    if not parts:
+      return np.zeros((0, 2), dtype=np.int64)
+    return np.concatenate(parts)
+
+  def parse_lines(self, lines, first_line, columns):
+    # slow path for chunks which are not all integers: non-integer values are only allowed after the node ids
+    rows = []
+    for number, text_line in enumerate(lines, first_line):
+      fields = text_line.split()
+      if not fields:
+        continue
+      try:
+        if len(fields) != columns:
+          raise ValueError('expected %d fields, found %d' % (columns, len(fields)))
+        rows.append((int(fields[0]), int(fields[1])))
+        for field in fields[2:]:
+          float(field)
+      except ValueError as error:
+        raise ValueError('%s, line %d: %s (%r)' % (self.filename, number, error, text_line.strip()))
+    return np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+  def save(self, adjacency, cache_path):
+    # arrays are written to a temporary directory first, which is then moved into place
+    if not os.path.isdir(self.cache_directory):
+      os.makedirs(self.cache_directory)
+    directory = tempfile.mkdtemp(dir=self.cache_directory)
+    adjacency.save(directory)
+    try:
+      os.rename(directory, cache_path)
+      adjacency.path = cache_path
+    except OSError:
+      # another run cached the same file in the meantime
+      shutil.rmtree(directory, ignore_errors=True)
+      adjacency.path = None
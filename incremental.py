@@ -0,0 +1,251 @@
+#incremental.py
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import shortest_path
+import parallel
+import neighborhoods
+import shortest_paths
+from adjacency import edge_keys
+
+# incremental recomputation of metrics after a small change of the edge set (see MetricCalculator.update)
+# self is the calculator of the changed graph, self.previous the calculator of the graph before the change
+# with all its columns calculated, and self.delta the EdgeDelta between both graphs
+# results of nodes the change cannot affect are carried over from the previous columns, all others are calculated again
+
+
+class EdgeDelta(object):
+  # difference between the edge sets of the previous and the current graph
+  # previous_positions maps every position of the current graph to the position of the same node in the previous graph,
+  # current_positions does the reverse, nodes missing in the other graph are mapped to -1
+  # added and removed hold the changed edges as (source, target) rows of node ids
+
+  def __init__(self, previous, adjacency):
+    self.previous  = previous
+    self.adjacency = adjacency
+
+    self.previous_positions = positions_in(previous.nodes, adjacency.nodes)
+    self.current_positions  = positions_in(adjacency.nodes, previous.nodes)
+
+    previous_edges = previous.edges()
+    current_edges  = adjacency.edges()
+    ids            = np.union1d(previous.nodes, adjacency.nodes)
+    previous_keys  = edge_keys(ids, previous_edges)
+    current_keys   = edge_keys(ids, current_edges)
+
+    self.added     = current_edges[~np.in1d(current_keys, previous_keys)]
+    self.removed   = previous_edges[~np.in1d(previous_keys, current_keys)]
+    self.balls     = {}
+
+  def carry(self, values, fill=0.0):
+    # column of the current graph with the values of the previous column, fill for nodes new in the current graph
+    column = np.empty(self.adjacency.number_of_nodes(), dtype=np.float64)
+    column.fill(fill)
+    kept   = self.previous_positions >= 0
+    column[kept] = np.asarray(values)[self.previous_positions[kept]]
+    return column
+
+  def within(self, radius):
+    # ascending positions of the current graph within radius hops of an endpoint of a changed edge
+    # hops are counted in the union of both graphs, so that paths over removed edges count as well
+    if radius not in self.balls:
+      n      = self.adjacency.number_of_nodes()
+      ends   = self.current(np.concatenate((self.added.ravel(), self.removed.ravel())))
+      ends   = ends[ends >= 0]
+
+      removed = self.current(self.removed).reshape(-1, 2)
+      removed = removed[(removed >= 0).all(axis=1)]
+      union   = self.adjacency.matrix() + sp.csr_matrix((np.ones(2 * len(removed)), (np.concatenate((removed[:, 0], removed[:, 1])), np.concatenate((removed[:, 1], removed[:, 0])))), shape=(n, n))
+
+      reached = np.zeros(n, dtype=np.float64)
+      reached[ends] = 1.0
+      for _ in range(radius):
+        reached = reached + union.dot(reached)
+      self.balls[radius] = np.flatnonzero(reached)
+    return self.balls[radius]
+
+  def current(self, ids):
+    # positions of node ids in the current graph, -1 for nodes not in the current graph
+    return positions_in(self.adjacency.nodes, np.asarray(ids).ravel()).reshape(np.shape(ids))
+
+  def previous_sources(self):
+    # positions of the previous graph (-1 for new nodes) of the endpoints of all changed edges, one row per edge,
+    # together with a flag per edge which is True for added and False for removed edges
+    edges = np.concatenate((self.added, self.removed)).reshape(-1, 2)
+    pairs = positions_in(self.previous.nodes, edges.ravel()).reshape(-1, 2)
+    return pairs, np.arange(len(pairs)) < len(self.added)
+
+
+def positions_in(nodes, ids):
+  # positions of ids in the ascending array nodes, -1 for ids not in nodes
+  if len(nodes) == 0:
+    return -np.ones(len(ids), dtype=np.int64)
+  positions = np.minimum(np.searchsorted(nodes, ids), len(nodes) - 1)
+  return np.where(nodes[positions] == ids, positions, -1)
+
+
+#############
+# local metrics
+#############
+# a change of an edge (u, v) changes the degrees of u and v, the clustering coefficients of u, v and their common
+# neighbors and the neighbor degrees of all neighbors of u and v: all within one hop of an endpoint
+# two-hop neighborhoods and the degrees in them change for all nodes within two hops of an endpoint
+
+def local(self, metric_name, radius, kernel):
+  # previous column with the values of all positions within radius hops of a changed edge calculated again
+  values   = self.delta.carry(self.previous.columns[metric_name])
+  affected = self.delta.within(radius)
+  if len(affected):
+    values[affected] = np.concatenate(self.pool.map(kernel, self.adjacency, parallel.chunks(affected.tolist(), self.node_chunk_size)))
+  return values
+
+def clustering_coefficient(self):
+  if self.adjacency.low_memory:
+    values   = self.delta.carry(self.previous.columns['clustering_coefficient'])
+    affected = self.delta.within(1)
+    values[affected] = neighborhoods.clustering_coefficients(self, affected)
+    return values
+  return local(self, 'clustering_coefficient', 1, neighborhoods.clustering_coefficient_chunk)
+
+def average_neighbor_degree(self):
+  return local(self, 'average_neighbor_degree', 1, neighborhoods.average_neighbor_degree_chunk)
+
+def iterated_average_neighbor_degree(self):
+  with self.lock('two_hop'):
+    if not hasattr(self, 'all_iterated_average_neighbor_degrees'):
+      two_hop_statistics(self)
+  return self.all_iterated_average_neighbor_degrees
+
+def correct_iterated_average_neighbor_degree(self):
+  with self.lock('two_hop'):
+    if not hasattr(self, 'all_corrected_iterated_average_neighbor_degrees'):
+      two_hop_statistics(self)
+  return self.all_corrected_iterated_average_neighbor_degrees
+
+def two_hop_statistics(self):
+  averages  = self.delta.carry(self.previous.columns['iterated_average_neighbor_degree'])
+  corrected = self.delta.carry(self.previous.columns['corrected_iterated_average_neighbor_degree'])
+  affected  = self.delta.within(2)
+  if len(affected):
+    averages[affected], corrected[affected] = neighborhoods.two_hop_values(self, affected)
+
+  self.all_iterated_average_neighbor_degrees           = averages
+  self.all_corrected_iterated_average_neighbor_degrees = corrected
+
+
+#############
+# shortest path metrics
+#############
+# only sources whose shortest paths change have to be searched again, which depends on the distances d(s, u) and d(s, v)
+# in the previous graph from a source s to the endpoints of every changed edge (u, v):
+# - the distances from s stay the same if every removed edge joins nodes at equal distance from s and every added edge
+#   joins nodes whose distances differ by at most one, so eccentricity and average shortest path length of s stay the same
+# - the shortest paths from s stay the same (and with them the dependencies of all nodes on s, i.e. the contribution
+#   of s to the betweenness centralities) if every changed edge joins nodes at equal distance from s
+# exact betweenness centralities are updated by subtracting the previous dependencies on every affected source and adding
+# the current ones; approximated betweenness centralities are always sampled again
+# if more than incremental_source_fraction of all nodes would have to be searched or distances are not normalized
+# per component (see components.py), everything is calculated again
+
+def betweenness_centrality(self):
+  with self.lock('shortest_paths'):
+    if not hasattr(self, 'all_betweenness_centralities'):
+      if self.betweenness_mode == 'exact':
+        sweep(self)
+      else:
+        shortest_paths.approximate_betweenness(self)
+  return self.all_betweenness_centralities
+
+def eccentricity(self):
+  with self.lock('shortest_paths'):
+    if not hasattr(self, 'all_eccentricities'):
+      sweep(self)
+  return self.all_eccentricities
+
+def average_shortest_path_length(self):
+  with self.lock('shortest_paths'):
+    if not hasattr(self, 'all_average_shortest_path_lengths'):
+      sweep(self)
+  return self.all_average_shortest_path_lengths
+
+
+def affected_sources(self, edges_per_search=8):
+  # boolean masks over the positions of the previous graph: sources whose distances change and sources whose shortest
+  # paths change; distances from the endpoints are searched for a few edges at a time to bound the memory
+  previous = self.previous.adjacency
+  pairs, added = self.delta.previous_sources()
+  unreached    = np.empty(previous.number_of_nodes())
+  unreached.fill(np.inf)
+
+  distances_changed = np.zeros(previous.number_of_nodes(), dtype=bool)
+  paths_changed     = np.zeros(previous.number_of_nodes(), dtype=bool)
+
+  for start in range(0, len(pairs), edges_per_search):
+    part      = pairs[start:start + edges_per_search]
+    endpoints = np.unique(part[part >= 0])
+    rows      = {}
+    if len(endpoints):
+      rows = dict(zip(endpoints.tolist(), shortest_path(previous.matrix(), method='D', unweighted=True, indices=endpoints)))
+
+    for (u, v), is_added in zip(part.tolist(), added[start:start + edges_per_search].tolist()):
+      du = rows.get(u, unreached)
+      dv = rows.get(v, unreached)
+      with np.errstate(invalid='ignore'):
+        difference = np.abs(du - dv)
+      # nodes which reach neither endpoint are not affected
+      difference[np.isinf(du) & np.isinf(dv)] = 0.0
+
+      paths_changed |= difference >= 1
+      if is_added:
+        distances_changed |= difference >= 2
+      else:
+        distances_changed |= difference == 1
+
+  return distances_changed, paths_changed
+
+
+def sweep(self):
+  # eccentricities, average shortest path lengths and exact betweenness centralities (in exact mode) of the current graph
+  delta = self.delta
+  exact = self.betweenness_mode == 'exact'
+  n     = self.adjacency.number_of_nodes()
+  limit = self.incremental_source_fraction * n
+
+  # scaling distances against the whole graph changes every value when the number of nodes changes
+  pairs, _ = delta.previous_sources()
+  if len(np.unique(pairs[pairs >= 0])) > limit or self.distance_normalization != 'component':
+    return shortest_paths.sweep(self)
+
+  distances_changed, paths_changed = affected_sources(self)
+  affected = paths_changed if exact else distances_changed
+
+  # sources of the current graph to search: affected sources still in the graph and all new nodes
+  kept    = delta.current_positions[np.flatnonzero(affected)]
+  sources = np.union1d(kept[kept >= 0], np.flatnonzero(delta.previous_positions < 0))
+  if len(sources) > limit:
+    return shortest_paths.sweep(self)
+
+  if exact:
+    # previous dependencies on the affected sources, subtracted from the unscaled previous betweenness centralities
+    m        = self.previous.adjacency.number_of_nodes()
+    previous = self.previous.columns['betweenness_centrality'] / shortest_paths.betweenness_scale(m)
+    for part in self.pool.map(shortest_paths.source_chunk, self.previous.adjacency, parallel.chunks(np.flatnonzero(affected).tolist(), self.source_chunk_size)):
+      previous = previous - part[3]
+    dependencies = delta.carry(previous)
+
+  chunk = shortest_paths.source_chunk if exact else shortest_paths.distance_chunk
+  parts = self.pool.map(chunk, self.adjacency, parallel.chunks(sources.tolist(), self.source_chunk_size))
+
+  eccentricities                = delta.carry(self.previous.columns['eccentricity'])
+  average_shortest_path_lengths = delta.carry(self.previous.columns['average_shortest_path_length'])
+  if len(parts):
+    eccentricities[sources]                = np.concatenate([part[0] for part in parts])
+    average_shortest_path_lengths[sources] = np.concatenate([part[1] for part in parts]) / np.concatenate([part[2] for part in parts]).astype(np.float64)
+
+  self.all_eccentricities                = eccentricities
+  self.all_average_shortest_path_lengths = average_shortest_path_lengths
+  if exact:
+    for part in parts:
+      dependencies += part[3]
+    # subtracting and adding dependencies leaves rounding errors around zero for nodes on no shortest path
+    self.all_betweenness_centralities = np.maximum(dependencies, 0.0) * shortest_paths.betweenness_scale(n)
+    shortest_paths.store_betweenness_sampling(self, {'mode': 'exact', 'pivots': n, 'error_estimate': 0.0})
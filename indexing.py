@@ -1,22 +1,22 @@
 #indexing
 def index_nodes(self):
-  self.redis.sadd(self.node_index_key, self.nodes) 
+  self.writer.sadd(self.node_index_key, *self.nodes)
 
 def index_neighbors(self):
-  for node in self.nodes:
-    node_neighbors = self.graph.neighbors(int(node))
-    self.redis.sadd(self.node_neighbors_prefix+str(node), node_neighbors)
+  for position, node in enumerate(self.nodes):
+    node_neighbors = self.adjacency.nodes[self.adjacency.neighbors(position)].tolist()
+    self.writer.sadd(self.node_neighbors_prefix+str(node), *node_neighbors)
 
 def index_metrics(self):
   for metric in self.base_metrics:
-    self.redis.sadd(self.metric_index_key, metric)
+    self.writer.sadd(self.metric_index_key, metric)
   
   for advanced_metric in self.advanced_metrics:
-    self.redis.sadd(self.metric_index_key, advanced_metric)
+    self.writer.sadd(self.metric_index_key, advanced_metric)
 
 def index_scores(self):
   for score in self.scores:
-    self.redis.sadd(self.score_index_key, score)
+    self.writer.sadd(self.score_index_key, score)
 
   for advanced_score in self.advanced_scores:
-    self.redis.sadd(self.score_index_key, advanced_score)
\ No newline at end of file
+    self.writer.sadd(self.score_index_key, advanced_score)
\ No newline at end of file
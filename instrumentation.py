@@ -0,0 +1,83 @@
+#instrumentation.py
+import sys
+import time
+import json
+import resource
+from contextlib import contextmanager
+
+# getrusage of the calling thread only (linux), python 2 lacks the constant
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD', 1 if sys.platform.startswith('linux') else None)
+
+class RunReport(object):
+  # collects wall and cpu time, peak memory, redis traffic and node throughput of every calculation stage
+  # stages are recorded in the order they finish, nested stages (e.g. single metrics) before their parent stage
+  # every stage has a scope: 'process' stages count the cpu time and redis traffic of the whole process, 'thread'
+  # stages (the tasks run concurrently by the scheduler) only those of the thread running them, so that tasks running
+  # at the same time are not charged with each other's work; cpu_time of thread stages is None where threads cannot
+  # be measured (other platforms than linux)
+  # worker_cpu_time is the cpu time the worker processes of the pool report for the tasks of a stage, it is only
+  # recorded with a pool; peak memory is only known for the process as a whole (process_peak_rss_mb), not per stage
+  # and not for the workers
+
+  def __init__(self, run_id, nodes, writer, pool=None):
+    self.run_id  = run_id
+    self.nodes   = nodes
+    self.writer  = writer
+    self.pool    = pool
+    self.started = time.time()
+    self.stages  = []
+
+    # metrics read from their checkpoints instead of being calculated
+    self.resumed = []
+
+  def snapshot(self, scope='process'):
+    if scope == 'thread':
+      if RUSAGE_THREAD is not None:
+        own = resource.getrusage(RUSAGE_THREAD)
+      commands, size, round_trips = self.writer.thread_traffic()
+      measures = {'wall_time'        : time.time(),
+                  'cpu_time'         : own.ru_utime + own.ru_stime if RUSAGE_THREAD is not None else None,
+                  'redis_commands'   : commands,
+                  'redis_bytes'      : size,
+                  'redis_round_trips': round_trips}
+      if self.pool is not None:
+        measures['worker_cpu_time'] = self.pool.thread_worker_cpu_time()
+      return measures
+
+    own      = resource.getrusage(resource.RUSAGE_SELF)
+    measures = {'wall_time'        : time.time(),
+                'cpu_time'         : own.ru_utime + own.ru_stime,
+                'redis_commands'   : self.writer.commands_sent,
+                'redis_bytes'      : self.writer.bytes_sent,
+                'redis_round_trips': self.writer.total_round_trips}
+    if self.pool is not None:
+      measures['worker_cpu_time'] = self.pool.worker_cpu_time
+    return measures
+
+  @contextmanager
+  def stage(self, name, scope='process'):
+    # scope 'thread' for stages which run concurrently with others
+    before = self.snapshot(scope)
+    yield
+    after  = self.snapshot(scope)
+
+    # ru_maxrss is the peak resident set size of the process since it started (not of the stage), in kilobytes
+    entry = {'stage': name, 'scope': scope, 'process_peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+    for measure in before:
+      entry[measure] = after[measure] - before[measure] if before[measure] is not None else None
+    entry['nodes_per_second'] = self.nodes / entry['wall_time'] if entry['wall_time'] > 0 else None
+    self.stages.append(entry)
+
+  def as_dict(self):
+    return {'run_id' : self.run_id,
+            'started': self.started,
+            'nodes'  : self.nodes,
+            'stages' : self.stages,
+            'resumed': self.resumed}
+
+  def to_json(self):
+    return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+  def save(self, filename):
+    with open(filename, 'w') as report_file:
+      report_file.write(self.to_json())
@@ -1,3 +1,7 @@
+import json
+import hashlib
+import datetime
+import threading
 import networkx as nx
 import redis as rd
 import numpy as np
@@ -5,28 +9,70 @@ import indexing
 import statistics
 import normalizations
 import config
+import parallel
+import scoring
+import compact
+import versions
+import temporal
+from redis_writer import RedisWriter
+from column_store import ColumnStore
+from parallel import WorkerPool
+from instrumentation import RunReport
+from scheduler import Scheduler
+from checkpoints import Checkpoints
+from incremental import EdgeDelta
 
 
 class MetricCalculator(object):
-  def __init__ (self, graph):
+  def __init__ (self, adjacency, workers=1, redis=None, resume=False, pool=None, namespace=None):
     #class constructor
     #define required class variables such as the graph to work on, the redis connection and the nodes of the graph
-
-    self.graph                = graph
-    self.redis                = rd.StrictRedis(host='localhost', port=6379, db=0)
-    self.nodes                = nx.nodes(graph)
-
+    #the graph is given in its compact form (see adjacency.py), as read by the FileImporter
+    #workers is the number of processes for the source and node partitioned metric calculations
+    #redis defaults to a connection to the local redis server
+    #with resume, metrics are read from valid checkpoints of earlier runs instead of being calculated (see checkpoints.py)
+    #pool is a WorkerPool shared with other calculators (see batch.py), which is not closed by this calculator
+    #namespace is a fixed namespace for all keys (see batch.py), which is cleared before the run instead of flushing
+    #the database and is never made live
+
+    self.adjacency            = adjacency
+    self.redis                = redis if redis is not None else rd.StrictRedis(host='localhost', port=6379, db=0)
+    self.writer               = RedisWriter(self.redis)
+    self.nodes                = adjacency.nodes.tolist()
+    self.pool                 = pool if pool is not None else WorkerPool(workers)
+    self.owns_pool            = pool is None
+
+    # in low memory mode, the graph is not expanded into python structures and columns may be spilled to disk
+    self.memory_budget_mb     = config.memory_budget_mb
+    self.adjacency.low_memory = self.memory_budget_mb is not None
+    column_budget             = self.memory_budget_mb * 2**20 // 2 if self.adjacency.low_memory else None
+
+    # all metrics, normalized metrics and scores are kept as columns until they are published to redis
+    self.columns              = ColumnStore(len(self.nodes), column_budget, config.spill_directory)
+
+    # timings and resource usage of all stages
+    # with microseconds, so that runs started within the same second get their own namespaces
+    self.run_id               = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    self.report               = RunReport(self.run_id, len(self.nodes), self.writer, self.pool)
+
+    # with versioned publishing, all keys of the run are written below its namespace (see versions.py)
+    self.fixed_namespace      = namespace is not None
+    self.versioned_publishing = config.versioned_publishing and not self.fixed_namespace
+    if self.fixed_namespace:
+      self.namespace          = namespace
+    else:
+      self.namespace          = versions.namespace(self.run_id) if self.versioned_publishing else ''
 
     # configuration variables are read from the config file and are also saved to class variables for easy access
-    self.node_index_key       = config.node_index_key
-    self.metric_index_key     = config.metric_index_key
-    self.score_index_key      = config.score_index_key
+    self.node_index_key       = self.namespace+config.node_index_key
+    self.metric_index_key     = self.namespace+config.metric_index_key
+    self.score_index_key      = self.namespace+config.score_index_key
     
-    self.node_neighbors_prefix = config.node_neighbors_prefix
-    self.node_prefix           = config.node_prefix
-    self.metric_prefix         = config.metric_prefix
-    self.score_prefix          = config.score_prefix
-    self.statistics_prefix     = config.statistics_prefix
+    self.node_neighbors_prefix = self.namespace+config.node_neighbors_prefix
+    self.node_prefix           = self.namespace+config.node_prefix
+    self.metric_prefix         = self.namespace+config.metric_prefix
+    self.score_prefix          = self.namespace+config.score_prefix
+    self.statistics_prefix     = self.namespace+config.statistics_prefix
 
     self.normalization_suffix  = config.normalization_suffix
 
@@ -38,132 +84,397 @@ class MetricCalculator(object):
     self.scores                = config.scores
     self.advanced_scores       = config.advanced_scores
 
+    self.dependencies          = config.dependencies
+    self.scheduler_threads     = config.scheduler_threads
+
+    self.resume                = resume
+    self.checkpoints           = Checkpoints(config.checkpoint_directory)
+    self.store_checkpoints     = config.store_checkpoints
+    self.metric_versions       = config.metric_versions
+    self.metric_parameters     = config.metric_parameters
+
+    # redis hashes written by a metric besides its column, keyed by metric name, checkpointed with the column
+    self.checkpoint_hashes     = {}
+
+    # calculator of the graph before the change and the edge delta, only set in incremental runs (see update)
+    self.previous              = None
+    self.delta                 = None
+    self.incremental_methods   = config.incremental_methods
+    self.incremental_source_fraction = config.incremental_source_fraction
+
+    # calculator of the preceding snapshot, whose scores are subtracted from the scores (see temporal.py)
+    self.baseline              = None
+    self.delta_suffix          = config.delta_suffix
+    self.delta_prefix          = self.namespace+config.delta_prefix
+
+    # set once all columns are calculated
+    self.calculated            = False
+
+    self.storage_layout        = config.storage_layout
+    self.compact_prefix        = self.namespace+config.compact_prefix
+    self.compact_dtype         = config.compact_dtype
+    self.ranked_metrics        = config.ranked_metrics
+
+    self.round_trips_key       = self.namespace+config.round_trips_key
+    self.published_run_key     = config.published_run_key
+    self.run_report_prefix     = self.namespace+config.run_report_prefix
+    self.store_run_report      = config.store_run_report
+
+    self.source_chunk_size     = config.source_chunk_size
+    self.node_chunk_size       = config.node_chunk_size
+    self.two_hop_chunk_entries = config.two_hop_chunk_entries
+    if self.adjacency.low_memory:
+      # a two-hop path takes about 32 bytes in a sparse product and its intermediate results
+      self.two_hop_chunk_entries = max(1, min(self.two_hop_chunk_entries, self.memory_budget_mb * 2**20 // 4 // self.pool.workers // 32))
+
+    self.betweenness_mode              = config.betweenness_mode
+    self.betweenness_pivots            = config.betweenness_pivots
+    self.betweenness_seed              = config.betweenness_seed
+    self.betweenness_target_error      = config.betweenness_target_error
+    self.betweenness_sampling_key      = self.namespace+config.betweenness_sampling_key
+    self.distance_normalization        = config.distance_normalization
+    self.eccentricity_method           = config.eccentricity_method
+    self.bounding_min_component_size   = config.bounding_min_component_size
+    self.eccentricity_bounding_key     = self.namespace+config.eccentricity_bounding_key
+
+    # named locks for results which are shared by several concurrently calculated metrics
+    self.locks                 = {}
+    self.locks_lock            = threading.Lock()
 
     
-  def start(self):
-    #clean all data in Redis
-    self.redis.flushdb()
-    
-    #index creation
-    self.create_indexes()
-    
+  @property
+  def graph(self):
+    # networkx version of the graph, only built if a metric asks for it
+    if not hasattr(self, '_graph'):
+      self._graph = self.adjacency.to_networkx()
+    return self._graph
 
-    #main calculations
-    self.calculate_metrics()
-    self.calculate_advanced_metrics()
-    self.normalize_metrics()
-    self.calculate_scores()
-    self.calculate_advanced_scores()
+  def lock(self, name):
+    with self.locks_lock:
+      return self.locks.setdefault(name, threading.Lock())
 
-    #statistics
-    self.calculate_statistics()
+  def start(self):
+    #every stage is measured (see instrumentation.py), the run as a whole under 'total'
+    with self.report.stage('total'):
+      try:
+        #register the versioned run, or clean all data in Redis without versioned publishing
+        self.begin()
+
+        #index creation
+        with self.report.stage('create_indexes'):
+          self.create_indexes()
+
+        #main calculations and statistics, run as soon as their dependencies are available
+        with self.report.stage('calculations'):
+          self.calculate()
+
+        #write all results to redis at once
+        with self.report.stage('publish_results'):
+          self.publish_results()
+          self.activate()
+      finally:
+        #also after a failed run: the worker pool and its graph files, the spilled columns and older versions
+        self.close()
+
+    self.store_report()
+
+  def update(self, previous):
+    #incremental run: previous is the calculator of the graph whose results are in redis, this calculator's graph
+    #is the changed graph; metrics with an incremental method only recalculate what the changed edges affect
+    #redis is not flushed, only changed values are written (see publish_changes)
+    with self.report.stage('total'):
+      try:
+        self.begin(flush=False)
+
+        #results of the previous graph, read from its checkpoints if previous was created with resume
+        #(or already calculated, like the preceding snapshot of a batch)
+        with self.report.stage('previous_results'):
+          if not previous.calculated:
+            previous.calculate()
+          previous.close_pool()
+
+        self.previous = previous
+        self.delta    = EdgeDelta(previous.adjacency, self.adjacency)
+
+        with self.report.stage('calculations'):
+          self.calculate()
+
+        with self.report.stage('publish_changes'):
+          self.publish_changes()
+          self.activate()
+      finally:
+        previous.close_pool()
+        previous.columns.close()
+        self.close()
+
+    self.store_report()
+
+  def calculate(self):
+    self.schedule_calculations().run()
+    self.calculated = True
+
+  def close_pool(self):
+    if self.owns_pool:
+      self.pool.close()
+
+  def close(self):
+    #the pool and the spilled columns are released before the cleanup, which needs redis and may fail itself
+    try:
+      self.close_pool()
+      self.columns.close()
+    finally:
+      self.cleanup()
+
+  def begin(self, flush=True):
+    #a versioned run is registered before it writes anything, a fixed namespace is cleared,
+    #unversioned runs start from an empty database
+    if self.fixed_namespace:
+      versions.delete_namespace(self.redis, self.namespace, self.writer.batch_size)
+    elif self.versioned_publishing:
+      versions.register(self.redis, self.run_id)
+    elif flush:
+      self.redis.flushdb()
+
+  def activate(self):
+    #makes the published results live: the versioned pointer switch, or the id of the published run
+    #results in a fixed namespace are not live
+    if self.fixed_namespace:
+      return
+    if self.versioned_publishing:
+      versions.activate(self.redis, self.run_id)
+    else:
+      self.redis.set(self.published_run_key, self.run_id)
+
+  def cleanup(self):
+    #deletes older versions once this run is live
+    if self.versioned_publishing:
+      with self.report.stage('cleanup'):
+        versions.cleanup(self.redis)
+
+  def store_report(self):
+    #report the number of redis round trips of every stage and the run report
+    self.store_round_trips()
+    if self.store_run_report:
+      self.redis.set(self.run_report_prefix+self.run_id, self.report.to_json())
 
 ##################
 #### INDEXING ####
 ##################
   def create_indexes(self):
-    #call methods defined in indexing.py
-    indexing.index_nodes(self)
-    indexing.index_neighbors(self)
+    #call methods defined in indexing.py, the compact layout stores nodes and neighbors as packed arrays instead
+    if self.storage_layout == 'compact':
+      compact.index_graph(self)
+    else:
+      indexing.index_nodes(self)
+      indexing.index_neighbors(self)
     indexing.index_metrics(self)
     indexing.index_scores(self)
+    self.writer.flush('create_indexes')
 
-###########################
-#### CALCULATION LOOPS ####
-###########################
-  
-  def calculate_metrics(self):
-    # loop through all defined metrics and call specified calculation method for each node
-    for metric_name in self.base_metrics:
-      metric_method = self.base_metrics[metric_name]
-  
-    # loop through all nodes
-      for node in self.nodes:
-        # call calculation method of supplied metric for current node
-        node = int(node)
-        value = float(metric_method(self,node))
-     
-        #store result in node values
-        self.redis.hset(self.node_prefix+str(node), metric_name, value)
-
-        #also store result to metric set
-        self.redis.zadd(self.metric_prefix+metric_name, value, str(node))
-
-  
-  def calculate_advanced_metrics(self):
-    # loop through all defined_advanced_metrics and call specified calculation method
-    for advanced_metric_name in self.advanced_metrics:
-      metric_method = self.advanced_metrics[advanced_metric_name]
-
-      # loop through all nodes
-      for node in self.nodes:
-        node = int(node)
-        value = float(metric_method(self,node))
-
-        #store result in node values
-        self.redis.hset(self.node_prefix+str(node), advanced_metric_name, value)
-
-        #also store result to metric set
-        self.redis.zadd(self.metric_prefix+advanced_metric_name, value, str(node))
-
+##################
+#### SCHEDULING ####
+##################
 
-  # loop through all defined normalizations and call respective normalization method
-  # no default normalizations for metrics not listed in the "normalization_methods" hash
-  def normalize_metrics(self):
-    #fallback normalization: min-max
-    
+  def schedule_calculations(self):
+    # builds the task graph of all calculations (see scheduler.py):
+    # metrics and advanced metrics ('metric:<name>') depend on the results declared in config.dependencies,
+    # every normalization on its metric, the weighted scores (all in one task, 'scores') on their normalized metrics,
+    # advanced scores ('score:<name>') on their declared dependencies and the statistics of a column on the column
     all_metrics = dict(self.base_metrics.items() + self.advanced_metrics.items())
+    scheduler   = Scheduler(self.scheduler_threads)
 
+    # task which produces each column
+    producers = {}
     for metric_name in all_metrics:
-      if self.normalization_methods.has_key(metric_name):
-        normalization_method = self.normalization_methods[metric_name]
-      else:
-        #fallback normalization is min-max
-        normalization_method = normalizations.min_max
-      normalization_method(self,metric_name)
-    
-
-  def calculate_scores(self):
+      producers[metric_name] = 'metric:'+metric_name
+      producers[metric_name+self.normalization_suffix] = 'normalization:'+metric_name
     for score_name in self.scores:
-      metrics_with_weights = self.scores[score_name]
+      producers[score_name] = 'scores'
+    for score_name in self.advanced_scores:
+      producers[score_name] = 'score:'+score_name
 
-      for node in self.nodes:
-        score_value = 0.0
+    def requirements(name):
+      for dependency in self.dependencies.get(name, []):
+        if dependency not in producers:
+          raise ValueError('%s depends on %s, which is neither a metric, a normalized metric nor a score' % (name, dependency))
+      return [producers[dependency] for dependency in self.dependencies.get(name, [])]
 
-        # get normalized values
-        for metric in metrics_with_weights:
-          weight = self.scores[score_name][metric]
-          value = float(self.redis.hget(self.node_prefix+str(node),metric+self.normalization_suffix))
-          score_value += weight * value
-          
-        self.redis.hset(self.node_prefix+str(node),score_name, score_value)
-        self.redis.zadd(self.score_prefix+score_name, score_value, str(node))
+    for metric_name in all_metrics:
+      scheduler.add('metric:'+metric_name, self.task('metric:'+metric_name, self.calculate_metric, metric_name, all_metrics[metric_name]), requirements(metric_name))
+      scheduler.add('normalization:'+metric_name, self.task('normalization:'+metric_name, self.normalize_metric, metric_name), ['metric:'+metric_name])
+
+    scheduler.add('scores', self.task('scores', self.calculate_scores), sorted(set('normalization:'+metric for score_name in self.scores for metric in self.scores[score_name])))
 
-  def calculate_advanced_scores(self):
     for advanced_score in self.advanced_scores:
-      self.advanced_scores[advanced_score](self)   
+      scheduler.add('score:'+advanced_score, self.task('score:'+advanced_score, self.calculate_advanced_score, advanced_score), requirements(advanced_score))
 
+    # statistics of the absolute and normalized metrics and of all scores, correlations of the absolute metrics
+    for column in producers:
+      scheduler.add('statistics:'+column, self.task('statistics:'+column, statistics.calculate_statistics, self, column), [producers[column]])
+    scheduler.add('correlations', self.task('correlations', statistics.calculate_correlations, self), ['metric:'+metric_name for metric_name in all_metrics])
 
-  #############
-  # statistics
-  #############
-  
-  def calculate_statistics(self):
-    for metric in self.base_metrics:
-      #absolute and normalized
-      statistics.calculate_statistics(self, metric, self.metric_prefix+metric)
-      statistics.calculate_statistics(self, metric+self.normalization_suffix, self.metric_prefix+metric+self.normalization_suffix)
+    # changes of all scores against the preceding snapshot, with their statistics
+    if self.baseline is not None:
+      scheduler.add('score_deltas', self.task('score_deltas', temporal.score_deltas, self), sorted(set(producers[score_name] for score_name in self.scores.keys() + self.advanced_scores.keys())))
 
-    for advanced_metric in self.advanced_metrics:
-      #absolute and normalized
-      statistics.calculate_statistics(self, advanced_metric, self.metric_prefix+advanced_metric)
-      statistics.calculate_statistics(self, advanced_metric+self.normalization_suffix, self.metric_prefix+advanced_metric+self.normalization_suffix)
+    return scheduler
 
-    for score in self.scores:
-      statistics.calculate_statistics(self, score, self.score_prefix+score)
+  def task(self, name, function, *args):
+    # task function which calls function(*args), measured under the task's name
+    # tasks run concurrently, so only the work of the thread running the task is counted
+    def run():
+      with self.report.stage(name, 'thread'):
+        function(*args)
+    return run
 
-    for advanced_score in self.advanced_scores:
-      statistics.calculate_statistics(self, advanced_score, self.score_prefix+advanced_score)
+###########################
+#### CALCULATIONS      ####
+###########################
+  
+  def calculate_metric(self, metric_name, metric_method):
+    # call specified calculation method, which returns the column for all nodes
+    # every calculated column is checkpointed, with resume the column of a valid checkpoint is used instead
+    key = self.checkpoint_key(metric_name)
+
+    if self.resume:
+      checkpoint = self.checkpoints.load(key)
+      if checkpoint is not None:
+        values, hashes = checkpoint
+        self.columns[metric_name] = values
+        for redis_key in hashes:
+          for field in hashes[redis_key]:
+            self.writer.hset(self.namespace+redis_key, field, hashes[redis_key][field])
+        self.report.resumed.append(metric_name)
+        return
+
+    if self.previous is not None and metric_name in self.incremental_methods:
+      metric_method = self.incremental_methods[metric_name]
+
+    self.columns[metric_name] = metric_method(self)
+    if self.store_checkpoints:
+      # hash keys are checkpointed without the namespace of the run, which differs for every run
+      hashes = self.checkpoint_hashes.get(metric_name, {})
+      hashes = dict((redis_key[len(self.namespace):], hashes[redis_key]) for redis_key in hashes)
+      self.checkpoints.save(key, self.columns[metric_name], hashes)
+
+  def checkpoint_key(self, name):
+    # sha1 over everything a metric column depends on: the graph, the method, its version and parameters and the keys
+    # of the metrics it reads; only metrics are checkpointed, normalized metrics and scores are calculated every run
+    all_metrics = dict(self.base_metrics.items() + self.advanced_metrics.items())
+    method      = all_metrics[name]
+    parts       = [self.adjacency.fingerprint(), name, method.__module__+'.'+method.__name__, self.metric_versions.get(name, 1),
+                   [[parameter, getattr(self, parameter)] for parameter in self.metric_parameters.get(name, [])]]
+    parts.append([self.checkpoint_key(dependency) for dependency in sorted(self.dependencies.get(name, []))])
+    return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+  # call the normalization method of the metric
+  # no default normalizations for metrics not listed in the "normalization_methods" hash
+  def normalize_metric(self, metric_name):
+    if self.normalization_methods.has_key(metric_name):
+      normalization_method = self.normalization_methods[metric_name]
+    else:
+      #fallback normalization is min-max
+      normalization_method = normalizations.min_max
+    normalization_method(self,metric_name)
 
-    statistics.calculate_correlations(self)
+  def calculate_scores(self):
+    # all weighted scores as one product of the normalized columns and the weight matrix (see scoring.py)
+    scoring.weighted_scores(self, self.scores)
+
+  def calculate_advanced_score(self, advanced_score):
+    self.columns[advanced_score] = self.advanced_scores[advanced_score](self)
+
+  ##############
+  # publishing
+  ##############
+
+  def publish_results(self):
+    # redis is only written to here: every column goes to the node hashes and to its sorted set (see compact.py
+    # for the compact layout),
+    # together with the statistics and other results buffered by the writer during the calculation
+    # writes are streamed in chunks of nodes, so only one chunk of commands is buffered at a time
+    sorted_sets = self.sorted_sets()
+    names       = self.columns.names()
+    if self.storage_layout == 'compact':
+      return compact.publish(self, sorted_sets)
+
+    for positions in parallel.chunks(range(len(self.nodes)), self.writer.batch_size):
+      values = dict((name, self.columns[name][positions].tolist()) for name in names)
+      for i, position in enumerate(positions):
+        node = str(self.nodes[position])
+        for name in names:
+          value = values[name][i]
+          self.writer.hset(self.node_prefix+node, name, value)
+          if name in sorted_sets:
+            self.writer.zadd(sorted_sets[name], value, node)
+      self.writer.flush('publish_results')
+
+    self.writer.flush('publish_results')
+
+  def publish_changes(self):
+    # incremental counterpart of publish_results: writes the changed values of existing nodes and all values of new nodes,
+    # removes the nodes which are not in the graph anymore and writes the neighbor sets of all endpoints of changed edges
+    # statistics and the other results buffered by the writer are written completely
+    # in the compact layout, the packed graph and columns are written again as a whole, and so is everything with
+    # versioned publishing or a fixed namespace, where the run starts from an empty namespace (only the calculation is
+    # incremental then)
+    if self.storage_layout == 'compact' or self.versioned_publishing or self.fixed_namespace:
+      self.create_indexes()
+      return self.publish_results()
+
+    sorted_sets = self.sorted_sets()
+    previous    = self.delta.previous_positions
+    kept        = previous >= 0
+
+    for name in self.columns.names():
+      values  = self.columns[name]
+      changed = np.ones(len(values), dtype=bool)
+      if name in self.previous.columns:
+        changed[kept] = values[kept] != self.previous.columns[name][previous[kept]]
+
+      for position in np.flatnonzero(changed).tolist():
+        node  = str(self.nodes[position])
+        value = float(values[position])
+        self.writer.hset(self.node_prefix+node, name, value)
+        if name in sorted_sets:
+          self.writer.zadd(sorted_sets[name], value, node)
+      self.writer.flush('publish_changes')
+
+    removed_nodes = self.previous.adjacency.nodes[self.delta.current_positions < 0].tolist()
+    for node in removed_nodes:
+      self.writer.delete(self.node_prefix+str(node), self.node_neighbors_prefix+str(node))
+    if removed_nodes:
+      self.writer.srem(self.node_index_key, *removed_nodes)
+      for key in set(sorted_sets.values()):
+        self.writer.zrem(key, *[str(node) for node in removed_nodes])
+
+    added_nodes = self.adjacency.nodes[~kept].tolist()
+    if added_nodes:
+      self.writer.sadd(self.node_index_key, *added_nodes)
+
+    for position in self.delta.within(0).tolist():
+      key = self.node_neighbors_prefix+str(self.nodes[position])
+      self.writer.delete(key)
+      self.writer.sadd(key, *self.adjacency.nodes[self.adjacency.neighbors(position)].tolist())
+
+    indexing.index_metrics(self)
+    indexing.index_scores(self)
+    self.writer.flush('publish_changes')
+
+  def sorted_sets(self):
+    # redis sorted set of every published column
+    sorted_sets = {}
+    for metric in self.base_metrics.keys() + self.advanced_metrics.keys():
+      sorted_sets[metric] = self.metric_prefix+metric
+      sorted_sets[metric+self.normalization_suffix] = self.metric_prefix+metric+self.normalization_suffix
+    for score in self.scores.keys() + self.advanced_scores.keys():
+      sorted_sets[score] = self.score_prefix+score
+      if score+self.delta_suffix in self.columns:
+        sorted_sets[score+self.delta_suffix] = self.score_prefix+score+self.delta_suffix
+    return sorted_sets
+
+  def store_round_trips(self):
+    for stage in self.writer.stages:
+      self.writer.hset(self.round_trips_key, stage, self.writer.round_trips[stage])
+    self.writer.flush('store_round_trips')
 
@@ -1,129 +1,94 @@
 #metrics.py
-import networkx as nx
 import numpy as np
-
-def clustering_coefficient(self,node):
-  #in the first run calculate the metric for all nodes at once and save in a hash of the instance to access later
-  #NOTE: this should result in a performance gain, but for very large graphs this might be a problem.
-  #      in this case, just returning nx.clustering(self.graph, node) might be better
-  if not hasattr(self, 'all_clustering_coefficients'):
-    self.all_clustering_coefficients = nx.clustering(self.graph)
-
-  #get the actual value from the pre-calculated hash
-  return self.all_clustering_coefficients[node]
-
-def degree(self, node):
-  return self.graph.degree(node)
-
-
-def average_neighbor_degree(self,node):
-  # same caching technique as in self.clustering_coefficient
-  # might also break for very large graphs
-  # nx.average_neighbor_degree(self.graph, nodes=node) might be the way to go
-
-  if not hasattr(self, 'all_average_neighbor_degrees'):
-    self.all_average_neighbor_degrees = nx.average_neighbor_degree(self.graph)
-  return self.all_average_neighbor_degrees[node]
-
-def iterated_average_neighbor_degree(self, node):
-  
-  first_level_neighbors = self.graph.neighbors(node)
-  second_level_neighbors = []
-
-  # get all two-hop nodes
-  for first_level_neighbor in first_level_neighbors:
-    current_second_level_neighbors = self.graph.neighbors(first_level_neighbor)
-    second_level_neighbors.extend(current_second_level_neighbors)
-
-  #remove one-hop nodes and self
-  relevant_nodes = set(second_level_neighbors) - set(first_level_neighbors) - set([node])
-  
-  degree_sum = 0
-  for relevant_node in relevant_nodes:
-    degree_sum += self.graph.degree(relevant_node)
-
-  return float(degree_sum)/float(len(relevant_nodes))
-
-def betweenness_centrality(self, node):
-  if not hasattr(self, 'all_betweenness_centralities'):
-    self.all_betweenness_centralities = nx.betweenness_centrality(self.graph)
-  return self.all_betweenness_centralities[node]
-
-def eccentricity(self, node):
-  if not hasattr(self, 'all_eccentricities'):
-    self.all_eccentricities = nx.eccentricity(self.graph)
-  return self.all_eccentricities[node]
-
-def average_shortest_path_length(self, node):
-  # caching average_shortest_path_length for all nodes at one failed
-  # already switched to single calculation
-
-  #get all shortest path lengths
-  all_shortest_path_lengths_for_node = nx.shortest_path_length(self.graph, source=node)
-
-  #calculate average
-  sum_of_lengths = 0
-  for target in all_shortest_path_lengths_for_node:
-    sum_of_lengths += all_shortest_path_lengths_for_node[target]
-  
-  return float(sum_of_lengths)/len(all_shortest_path_lengths_for_node)
+import shortest_paths
+import neighborhoods
+
+# every metric takes the calculator as its single parameter and returns a column with the value of every node,
+# ordered like self.nodes (the dense node positions of self.adjacency)
+
+def clustering_coefficient(self):
+  #the nodes are processed in chunks on the worker pool (see neighborhoods.py)
+  if self.adjacency.low_memory:
+    return neighborhoods.clustering_coefficients(self)
+  return neighborhoods.compute(self, neighborhoods.clustering_coefficient_chunk)
+
+def degree(self):
+  return self.adjacency.degrees()
+
+
+def average_neighbor_degree(self):
+  return neighborhoods.compute(self, neighborhoods.average_neighbor_degree_chunk)
+
+def iterated_average_neighbor_degree(self):
+  # average degree of all two-hop nodes (without one-hop nodes and self)
+  # calculated for all nodes at once by the sparse two-hop kernel, together with the corrected value
+  with self.lock('two_hop'):
+    if not hasattr(self, 'all_iterated_average_neighbor_degrees'):
+      neighborhoods.two_hop_statistics(self)
+  return self.all_iterated_average_neighbor_degrees
+
+# betweenness centrality, eccentricity and average shortest path length are all read from the results
+# of a single breadth first search per source (see shortest_paths.py), whichever metric comes first runs it
+# the results are cached on the instance for the other two metrics, the lock makes concurrently
+# scheduled metrics wait for the running search instead of starting their own
+
+def betweenness_centrality(self):
+  # exact (part of the sweep) or approximated from sampled pivots, see betweenness_mode in config.py
+  with self.lock('shortest_paths'):
+    if not hasattr(self, 'all_betweenness_centralities'):
+      if self.betweenness_mode == 'exact':
+        shortest_paths.sweep(self)
+      else:
+        shortest_paths.approximate_betweenness(self)
+  return self.all_betweenness_centralities
+
+def eccentricity(self):
+  # part of the sweep or, with eccentricity_method 'bounding', bounded from a few searches without waiting for the sweep
+  if self.eccentricity_method == 'bounding':
+    with self.lock('eccentricity'):
+      if not hasattr(self, 'bounded_eccentricities'):
+        shortest_paths.bounding_eccentricities(self)
+    return self.bounded_eccentricities
+
+  with self.lock('shortest_paths'):
+    if not hasattr(self, 'all_eccentricities'):
+      shortest_paths.sweep(self)
+  return self.all_eccentricities
+
+def average_shortest_path_length(self):
+  # average over the shortest path lengths to all reachable nodes, including the node itself
+  with self.lock('shortest_paths'):
+    if not hasattr(self, 'all_average_shortest_path_lengths'):
+      shortest_paths.sweep(self)
+  return self.all_average_shortest_path_lengths
 
 
 #############
 # advanced metrics
 #############
-def correct_clustering_coefficient(self,node):
-  clustering_coefficient = float(self.redis.hget(self.node_prefix+str(node),'clustering_coefficient'))
-  degree = float(self.redis.hget(self.node_prefix+str(node), 'degree'))
+# advanced metrics read the columns of the metrics they correct from self.columns
+
+def correct_clustering_coefficient(self):
+  clustering_coefficient = self.columns['clustering_coefficient']
+  degree = self.columns['degree']
   corrected_cc = clustering_coefficient + (degree * clustering_coefficient) / float(4)
   return corrected_cc
 
-def correct_average_neighbor_degree(self,node):
-  avgnd = float(self.redis.hget(self.node_prefix+str(node), 'average_neighbor_degree'))
-  
-  neighbors = self.graph.neighbors(node)
-  number_of_neighbors = float(len(neighbors))
-  neighbor_degrees = []
-  for neighbor in neighbors:
-    neighbor_degrees.append(self.graph.degree(neighbor))
-
-  #using numpy median and standard deviation implementation
-  numpy_neighbor_degrees = np.array(neighbor_degrees)
-  median = np.median(numpy_neighbor_degrees)
-  standard_deviation = np.std(numpy_neighbor_degrees)
-  
-  if avgnd == 0.0 or number_of_neighbors == 0.0 or standard_deviation == 0.0:
-    return avgnd
-  else:
-    return avgnd + ( ((median - avgnd) / standard_deviation) / number_of_neighbors ) * avgnd
-
-
-def correct_iterated_average_neighbor_degree(self, node):
-  avgnd = float(self.redis.hget(self.node_prefix+str(node), 'iterated_average_neighbor_degree'))
-
-  first_level_neighbors = self.graph.neighbors(node)
-  second_level_neighbors = []
-
-  # get all two-hop nodes
-  for first_level_neighbor in first_level_neighbors:
-    current_second_level_neighbors = self.graph.neighbors(first_level_neighbor)
-    second_level_neighbors.extend(current_second_level_neighbors)
-
-  #remove one-hop neighbors and self
-  relevant_nodes = set(second_level_neighbors) - set(first_level_neighbors) - set([node])
-
-  number_of_nodes = len(relevant_nodes)
-  node_degrees = []
-  for rel_node in relevant_nodes:
-    node_degrees.append(self.graph.degree(rel_node))
-
-  numpy_node_degrees = np.array(node_degrees)
-  median = np.median(numpy_node_degrees)
-  standard_deviation = np.std(numpy_node_degrees)
-
-  if avgnd == 0.0 or number_of_nodes == 0.0 or standard_deviation == 0.0:
-    return avgnd
-  else:
-    return avgnd + ( ((median - avgnd) / standard_deviation) / number_of_nodes ) * avgnd
-  
+def correct_average_neighbor_degree(self):
+  avgnd = self.columns['average_neighbor_degree']
+
+  # number, median and standard deviation of the neighbor degrees of all nodes
+  number_of_neighbors, _, median, standard_deviation = neighborhoods.neighborhood_statistics(self.adjacency.indptr, self.adjacency.degrees()[self.adjacency.indices])
+
+  with np.errstate(invalid='ignore', divide='ignore'):
+    corrected = avgnd + ( ((median - avgnd) / standard_deviation) / number_of_neighbors ) * avgnd
+  return np.where((avgnd == 0.0) | (number_of_neighbors == 0.0) | (standard_deviation == 0.0), avgnd, corrected)
+
 
+def correct_iterated_average_neighbor_degree(self):
+  # avgnd + (((median - avgnd) / standard_deviation) / number_of_nodes) * avgnd over the two-hop nodes
+  # comes from the same two-hop kernel run as iterated_average_neighbor_degree (see neighborhoods.py)
+  with self.lock('two_hop'):
+    if not hasattr(self, 'all_corrected_iterated_average_neighbor_degrees'):
+      neighborhoods.two_hop_statistics(self)
+  return self.all_corrected_iterated_average_neighbor_degrees
@@ -0,0 +1,221 @@
+#neighborhoods.py
+import numpy as np
+import scipy.sparse as sp
+import parallel
+
+# per-node metrics which only look at the direct and two-hop neighborhood of a node
+# every kernel takes the compact adjacency and a chunk of node positions and returns the values for the chunk,
+# so that the chunks can be spread over the worker pool; results follow the definitions used by networkx
+
+def clustering_coefficient_chunk(adjacency, positions):
+  neighbor_sets = adjacency.neighbor_sets()
+  values        = np.zeros(len(positions), dtype=np.float64)
+
+  for i, v in enumerate(positions):
+    neighbors = neighbor_sets[v]
+    degree    = len(neighbors)
+    if degree < 2:
+      continue
+    # every triangle is counted twice
+    triangles = 0
+    for w in neighbors:
+      triangles += len(neighbors & neighbor_sets[w])
+    values[i] = triangles / float(degree * (degree - 1))
+
+  return values
+
+
+def clustering_coefficient_sparse_chunk(adjacency, chunk):
+  # same values as clustering_coefficient_chunk, from the sparse product of the rows of a two-hop chunk (see below)
+  # with the adjacency matrix instead of python neighbor sets, which keeps the memory use within the chunk's budget
+  positions, budget = chunk
+  matrix  = adjacency.simple_matrix()
+  rows    = matrix[np.array(positions)]
+  degrees = np.diff(rows.indptr).astype(np.float64)
+
+  if len(positions) == 1 and np.sum(np.diff(matrix.indptr)[rows.indices]) > budget:
+    triangles = np.array([hub_triangles(matrix, rows.indices, budget)])
+  else:
+    # entry (v, u) of A[rows] * A is the number of common neighbors of v and u, summed over the neighbors u of v
+    triangles = np.asarray(rows.dot(matrix).multiply(rows).sum(axis=1)).ravel()
+
+  with np.errstate(invalid='ignore', divide='ignore'):
+    return np.where(degrees >= 2, triangles / (degrees * (degrees - 1)), 0.0)
+
+
+def hub_triangles(matrix, neighbors, budget):
+  # twice the number of triangles of a single high degree node, counted over groups of its neighbors with at most
+  # budget paths
+  lengths = np.diff(matrix.indptr)
+  member  = np.zeros(matrix.shape[0], dtype=bool)
+  member[neighbors] = True
+
+  triangles = 0
+  group     = []
+  total     = 0
+  for w in neighbors.tolist() + [None]:
+    if group and (w is None or total + lengths[w] > budget):
+      triangles += np.count_nonzero(member[np.concatenate([matrix.indices[matrix.indptr[u]:matrix.indptr[u + 1]] for u in group])])
+      group = []
+      total = 0
+    if w is not None:
+      group.append(w)
+      total += lengths[w]
+  return float(triangles)
+
+
+def clustering_coefficients(self, positions=None):
+  # clustering coefficients of the given positions (all nodes by default) from sparse products, in two-hop chunks
+  # used in low memory mode, where python neighbor sets are not built for the whole graph
+  chunks = two_hop_chunks(self.adjacency, self.two_hop_chunk_entries, positions)
+  if not chunks:
+    return np.zeros(0)
+  return np.concatenate(self.pool.map(clustering_coefficient_sparse_chunk, self.adjacency, chunks))
+
+
+def average_neighbor_degree_chunk(adjacency, positions):
+  neighbor_lists = adjacency.neighbor_lists()
+  degrees        = adjacency.degrees().tolist()
+  values         = np.zeros(len(positions), dtype=np.float64)
+
+  for i, v in enumerate(positions):
+    degree_sum = sum(degrees[w] for w in neighbor_lists[v])
+    values[i]  = degree_sum / float(max(degrees[v], 1))
+
+  return values
+
+
+#############
+# two-hop neighborhoods
+#############
+# the exclusive two-hop neighborhood of a node are all nodes exactly two hops away, without its direct neighbors and itself
+# the kernel works on a chunk of rows of the sparse adjacency matrix A at once: the nonzero entries of
+# A[rows] * A are all nodes within two hops, from which the entries of A[rows] and the nodes themselves are removed
+# the size of that product is bounded by the number of two-hop paths of the rows, so rows are grouped into chunks
+# of at most two_hop_chunk_entries paths; a hub with more paths than that is processed alone, neighbor group by group
+
+def two_hop_chunks(adjacency, budget, positions=None):
+  # chunks of an ascending array of positions (all nodes by default) with at most budget two-hop paths each
+  # (hubs above budget form their own chunk), every chunk is handed to the kernel together with the budget
+  lengths = np.diff(adjacency.indptr)
+  rows    = np.repeat(np.arange(len(lengths)), lengths)
+  paths   = np.bincount(rows, weights=lengths[adjacency.indices], minlength=len(lengths))
+  if positions is None:
+    positions = np.arange(len(lengths))
+
+  chunks  = []
+  current = []
+  total   = 0.0
+  for v, work in zip(positions.tolist(), paths[positions].tolist()):
+    if current and total + work > budget:
+      chunks.append((current, budget))
+      current = []
+      total   = 0.0
+    current.append(v)
+    total += work
+  if current:
+    chunks.append((current, budget))
+  return chunks
+
+
+def two_hop_chunk(adjacency, chunk):
+  # returns a 4 x len(positions) array with the size, the degree sum, the median degree and the standard deviation
+  # of the degrees of the exclusive two-hop neighborhood of every node of the chunk
+  positions, budget = chunk
+  if len(positions) == 1 and np.sum(np.diff(adjacency.indptr)[adjacency.neighbors(positions[0])]) > budget:
+    return hub_two_hop(adjacency, positions[0], budget)
+
+  matrix   = adjacency.matrix()
+  if positions[-1] - positions[0] + 1 == len(positions):
+    rows   = matrix[positions[0]:positions[-1] + 1]
+  else:
+    rows   = matrix[np.array(positions)]
+
+  # one-hop neighbors and the nodes themselves
+  excluded = rows + sp.csr_matrix((np.ones(len(positions)), (np.arange(len(positions)), positions)), shape=rows.shape)
+  excluded.data[:] = 1.0
+
+  reach = rows.dot(matrix)
+  reach.data[:] = 1.0
+  two_hop = reach - reach.multiply(excluded)
+  two_hop = sp.csr_matrix(two_hop)
+  two_hop.eliminate_zeros()
+  two_hop.sort_indices()
+
+  return neighborhood_statistics(two_hop.indptr, adjacency.degrees()[two_hop.indices])
+
+
+def hub_two_hop(adjacency, v, budget):
+  # two-hop neighborhood of a single high degree node, collected from groups of its neighbors with at most budget paths
+  degrees   = adjacency.degrees()
+  lengths   = np.diff(adjacency.indptr)
+  neighbors = adjacency.neighbors(v)
+  reach     = np.zeros(adjacency.number_of_nodes(), dtype=bool)
+
+  group = []
+  total = 0
+  for w in neighbors.tolist() + [None]:
+    if group and (w is None or total + lengths[w] > budget):
+      reach[np.concatenate([adjacency.neighbors(u) for u in group])] = True
+      group = []
+      total = 0
+    if w is not None:
+      group.append(w)
+      total += lengths[w]
+
+  reach[neighbors] = False
+  reach[v]         = False
+  relevant_nodes   = np.flatnonzero(reach)
+  return neighborhood_statistics(np.array([0, len(relevant_nodes)]), degrees[relevant_nodes])
+
+
+def neighborhood_statistics(indptr, values):
+  # size, sum, median and standard deviation of the values of every row of a CSR structure (empty rows give zeros)
+  counts  = np.diff(indptr)
+  rows    = np.repeat(np.arange(len(counts)), counts)
+  values  = values.astype(np.float64)
+  sums    = np.bincount(rows, weights=values, minlength=len(counts))
+
+  with np.errstate(invalid='ignore', divide='ignore'):
+    means     = np.where(counts > 0, sums / counts, 0.0)
+    deviation = values - means[rows]
+    stds      = np.sqrt(np.bincount(rows, weights=deviation * deviation, minlength=len(counts)) / counts)
+  stds[counts == 0] = 0.0
+
+  # medians from the values sorted within each row
+  ordered = values[np.lexsort((values, rows))]
+  medians = np.zeros(len(counts), dtype=np.float64)
+  filled  = counts > 0
+  lower   = indptr[:-1][filled] + (counts[filled] - 1) // 2
+  upper   = indptr[:-1][filled] + counts[filled] // 2
+  medians[filled] = (ordered[lower] + ordered[upper]) / 2.0
+
+  return np.vstack((counts, sums, medians, stds))
+
+
+def two_hop_statistics(self):
+  # runs the two-hop kernel for all nodes on the worker pool and caches both iterated average neighbor degrees
+  averages, corrected = two_hop_values(self)
+
+  self.all_iterated_average_neighbor_degrees           = averages
+  self.all_corrected_iterated_average_neighbor_degrees = corrected
+
+
+def two_hop_values(self, positions=None):
+  # iterated and corrected iterated average neighbor degrees of the given positions (all nodes by default)
+  chunks = two_hop_chunks(self.adjacency, self.two_hop_chunk_entries, positions)
+  if not chunks:
+    return np.zeros(0), np.zeros(0)
+  counts, sums, medians, stds = np.hstack(self.pool.map(two_hop_chunk, self.adjacency, chunks))
+
+  with np.errstate(invalid='ignore', divide='ignore'):
+    averages  = np.where(counts > 0, sums / counts, 0.0)
+    corrected = averages + (((medians - averages) / stds) / counts) * averages
+  corrected = np.where((averages == 0.0) | (counts == 0) | (stds == 0.0), averages, corrected)
+  return averages, corrected
+
+
+def compute(self, kernel):
+  # runs a kernel for all nodes on the worker pool and returns the column of values ordered by position
+  positions = parallel.chunks(range(self.adjacency.number_of_nodes()), self.node_chunk_size)
+  return np.concatenate(self.pool.map(kernel, self.adjacency, positions))
@@ -1,37 +1,70 @@
 #normalizations.py
+import numpy as np
+from scipy.stats import rankdata
+
+#normalizations read the column of the specified metric and store the normalized column as metric_name+normalization_suffix
+#every normalization transforms the whole column at once, see normalize
+
+def normalize(self, metric_name, transform):
+  #apply transform to the column of the metric and store the result
+  values = self.columns[metric_name]
+  self.columns[metric_name+self.normalization_suffix] = transform(values)
+
 def min_max(self,metric_name):
   #perform min max normalization of specified metric for all nodes
-  #min_max normalization
-  #get min and max from redis
-  x_min = self.redis.zrange(self.metric_prefix+metric_name, 0, 0, withscores=True, score_cast_func=float)[0][1]
-  x_max = self.redis.zrange(self.metric_prefix+metric_name, -1, -1, withscores=True, score_cast_func=float)[0][1]
-  
-  #print x_min
-  #print x_max
-  
-  for node in self.nodes:
-    if x_min == x_max:
-      x_normalized = 1.0
-    else:
-      x = float(self.redis.hget(self.node_prefix+str(node), metric_name))
-      x_normalized = (x - x_min) / (x_max - x_min)     
-  
-    #store value for node and metric
-    self.redis.zadd(self.metric_prefix+metric_name+self.normalization_suffix, x_normalized, str(node))
-    self.redis.hset(self.node_prefix+str(node),metric_name+self.normalization_suffix, x_normalized)
+  normalize(self, metric_name, min_max_values)
 
 #max min normalization
 def max_min(self,metric_name):
-  x_min = self.redis.zrange(self.metric_prefix+metric_name, 0, 0, withscores=True, score_cast_func=float)[0][1]
-  x_max = self.redis.zrange(self.metric_prefix+metric_name, -1, -1, withscores=True, score_cast_func=float)[0][1]
-  
-  for node in self.nodes:
-    if x_min == x_max:
-      x_normalized = 1.0
-    else:
-      x = float(self.redis.hget(self.node_prefix+str(node), metric_name))
-      x_normalized = (x_max - x) / (x_max - x_min)     
-
-    #store value for node and metric
-    self.redis.zadd(self.metric_prefix+metric_name+self.normalization_suffix, x_normalized, str(node))
-    self.redis.hset(self.node_prefix+str(node),metric_name+self.normalization_suffix, x_normalized)
\ No newline at end of file
+  normalize(self, metric_name, max_min_values)
+
+#z-score: distance from the mean in standard deviations
+def z_score(self,metric_name):
+  normalize(self, metric_name, z_score_values)
+
+#robust z-score: distance from the median in interquartile ranges, insensitive to outliers
+def robust(self,metric_name):
+  normalize(self, metric_name, robust_values)
+
+#percentile rank between 0 (smallest value) and 1 (largest value), ties get their average rank
+def percentile_rank(self,metric_name):
+  normalize(self, metric_name, percentile_rank_values)
+
+#min max normalization of the logarithm, for heavy-tailed metrics like degree and betweenness centrality
+#values are shifted to start at zero first, so that the logarithm is defined for every column
+def log_min_max(self,metric_name):
+  normalize(self, metric_name, lambda values: min_max_values(np.log1p(values - np.min(values))))
+
+
+def min_max_values(values):
+  x_min = np.min(values)
+  x_max = np.max(values)
+
+  if x_min == x_max:
+    return np.ones(len(values))
+  return (values - x_min) / (x_max - x_min)
+
+def max_min_values(values):
+  x_min = np.min(values)
+  x_max = np.max(values)
+
+  if x_min == x_max:
+    return np.ones(len(values))
+  return (x_max - values) / (x_max - x_min)
+
+def z_score_values(values):
+  standard_deviation = np.std(values)
+  if standard_deviation == 0.0:
+    return np.zeros(len(values))
+  return (values - np.mean(values)) / standard_deviation
+
+def robust_values(values):
+  lower, median, upper = np.percentile(values, [25, 50, 75])
+  if upper == lower:
+    return np.zeros(len(values))
+  return (values - median) / (upper - lower)
+
+def percentile_rank_values(values):
+  if len(values) < 2:
+    return np.ones(len(values))
+  return (rankdata(values) - 1.0) / (len(values) - 1)
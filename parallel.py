@@ -0,0 +1,86 @@
+#parallel.py
+import shutil
+import resource
+import tempfile
+import threading
+import multiprocessing
+from adjacency import Adjacency
+
+# graphs loaded by a worker process, keyed by the directory their arrays were saved to
+# only the most recently shared graph is kept
+worker_graphs = {}
+
+def run_task(task):
+  # executed inside the worker processes, returns the result together with the cpu time the worker spent on it
+  function, path, low_memory, chunk = task
+  before = resource.getrusage(resource.RUSAGE_SELF)
+  if path not in worker_graphs:
+    worker_graphs.clear()
+    worker_graphs[path] = Adjacency.load(path, mmap_mode='r')
+  worker_graphs[path].low_memory = low_memory
+  result = function(worker_graphs[path], chunk)
+  after  = resource.getrusage(resource.RUSAGE_SELF)
+  return result, (after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime)
+
+
+def chunks(items, chunk_size):
+  # splits a sequence into consecutive chunks of at most chunk_size items
+  # the chunks only depend on the chunk size, never on the number of workers, so that
+  # partial results are always reduced in the same order and serial and parallel runs agree exactly
+  items = list(items)
+  return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+class WorkerPool(object):
+  # runs functions of the form function(adjacency, chunk) for a list of chunks
+  # with one worker, chunks are processed in the calling process, otherwise in a pool of processes
+  # the graph is handed to the workers once: its arrays are saved to a temporary directory and
+  # memory mapped by every worker on its first task, tasks only carry the directory name
+  # map may be called from several threads at once (see scheduler.py), the graph is still saved only once
+
+  def __init__(self, workers=1):
+    self.workers     = max(1, workers)
+    self.pool        = multiprocessing.Pool(self.workers) if self.workers > 1 else None
+    self.directories = []
+    self.share_lock  = threading.Lock()
+
+    # cpu time the worker processes spent on tasks, in total and per calling thread (see instrumentation.py)
+    self.worker_cpu_time = 0.0
+    self.thread_totals   = threading.local()
+    self.cpu_lock        = threading.Lock()
+
+  def share(self, adjacency):
+    with self.share_lock:
+      if adjacency.path is None:
+        directory = tempfile.mkdtemp(prefix='coria_graph_')
+        self.directories.append(directory)
+        adjacency.save(directory)
+      return adjacency.path
+
+  def map(self, function, adjacency, chunks):
+    # returns the results of all chunks in chunk order
+    if self.pool is None:
+      return [function(adjacency, chunk) for chunk in chunks]
+
+    path    = self.share(adjacency)
+    results = self.pool.map(run_task, [(function, path, adjacency.low_memory, chunk) for chunk in chunks], 1)
+
+    cpu_time = sum(task_cpu_time for _, task_cpu_time in results)
+    with self.cpu_lock:
+      self.worker_cpu_time += cpu_time
+    self.thread_totals.worker_cpu_time = self.thread_worker_cpu_time() + cpu_time
+    return [result for result, _ in results]
+
+  def thread_worker_cpu_time(self):
+    # cpu time the workers spent on the maps of the calling thread
+    return getattr(self.thread_totals, 'worker_cpu_time', 0.0)
+
+  def close(self):
+    if self.pool is not None:
+      self.pool.close()
+      self.pool.join()
+      self.pool = None
+
+    for directory in self.directories:
+      shutil.rmtree(directory, ignore_errors=True)
+    self.directories = []
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+import json
+import time
+import argparse
+import threading
+import urlparse
+import collections
+import BaseHTTPServer
+import numpy as np
+import redis as rd
+import config
+import compact
+import versions
+
+# read layer over the results published in redis, for dashboards and other clients
+# supports top k nodes by any metric or score, the percentile rank of a node, batched fetches of many nodes and the
+# neighborhood of a node together with its values; all reads of a query are sent in one pipeline and query results are
+# kept in an LRU cache, which is cleared as soon as another run is published (see published_run_key in config.py)
+# with versioned publishing, all keys are read from the namespace of the live run (see versions.py)
+# works with both storage layouts; can be run as a small local http service returning json
+
+
+missing = object()
+
+class LRUCache(object):
+  # mapping with at most capacity entries, the least recently used entry is dropped first
+
+  def __init__(self, capacity):
+    self.capacity = capacity
+    self.entries  = collections.OrderedDict()
+    self.lock     = threading.Lock()
+
+  def lookup(self, key, default=None):
+    with self.lock:
+      if key not in self.entries:
+        return default
+      value = self.entries.pop(key)
+      self.entries[key] = value
+      return value
+
+  def put(self, key, value):
+    with self.lock:
+      self.entries.pop(key, None)
+      self.entries[key] = value
+      while len(self.entries) > self.capacity:
+        self.entries.popitem(last=False)
+
+  def get(self, key, compute):
+    # cached value of key, computed with compute() and stored if it is not cached
+    value = self.lookup(key, missing)
+    if value is missing:
+      value = compute()
+      self.put(key, value)
+    return value
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+
+  def __len__(self):
+    return len(self.entries)
+
+
+class Query(object):
+
+  def __init__(self, redis=None, cache_size=config.query_cache_size, check_interval=config.query_check_interval):
+    # check_interval is the number of seconds between two checks for a newly published run
+    self.redis                 = redis if redis is not None else rd.StrictRedis(host='localhost', port=6379, db=0)
+    self.cache                 = LRUCache(cache_size)
+    self.check_interval        = check_interval
+
+    self.normalization_suffix  = config.normalization_suffix
+    self.published_run_key     = config.published_run_key
+    self.live_run_key          = config.live_run_key
+    self.versioned_publishing  = config.versioned_publishing
+    self.storage_layout        = config.storage_layout
+
+    self.run                   = None
+    self.checked               = None
+    self.reader                = None
+    self.use_namespace('')
+
+  def use_namespace(self, namespace):
+    self.node_neighbors_prefix = namespace+config.node_neighbors_prefix
+    self.node_prefix           = namespace+config.node_prefix
+    self.metric_prefix         = namespace+config.metric_prefix
+    self.score_prefix          = namespace+config.score_prefix
+    self.metric_index_key      = namespace+config.metric_index_key
+    self.score_index_key       = namespace+config.score_index_key
+    self.compact_prefix        = namespace+config.compact_prefix
+
+  def check(self):
+    # clears the cache if another run was published since the last check and follows the pointer to the live run
+    now = time.time()
+    if self.checked is not None and now - self.checked < self.check_interval:
+      return
+    self.checked = now
+    pipe = self.redis.pipeline(transaction=False)
+    pipe.get(self.published_run_key)
+    pipe.get(self.live_run_key)
+    run, live = pipe.execute()
+    if run != self.run:
+      self.cache.clear()
+      self.reader = None
+      self.run    = run
+      self.use_namespace(versions.namespace(live) if self.versioned_publishing and live is not None else '')
+
+  def compact_reader(self):
+    if self.reader is None:
+      self.reader = compact.CompactReader(self.redis, self.compact_prefix)
+    return self.reader
+
+  #############
+  # queries
+  #############
+
+  def names(self):
+    # names of all published metrics, normalized metrics and scores
+    self.check()
+    return self.cache.get(('names',), self.fetch_names)
+
+  def top(self, name, k=10, details=False):
+    # the k nodes with the largest values of a metric or score as [node, value] pairs, largest first
+    # with details, every entry is the dict of all values of the node (see nodes) together with its rank
+    self.check()
+    ranking = self.cache.get(('top', name, k), lambda: self.fetch_top(name, k))
+    if not details:
+      return ranking
+    values = self.nodes([node for node, _ in ranking])
+    for rank, entry in enumerate(values):
+      entry['rank'] = rank + 1
+    return values
+
+  def percentile_rank(self, node, name):
+    # share of the other nodes with a smaller value, between 0 (smallest value) and 1 (largest value), ties get their
+    # average rank (like the percentile_rank normalization)
+    self.check()
+    return self.cache.get(('percentile_rank', node, name), lambda: self.fetch_percentile_rank(node, name))
+
+  def nodes(self, nodes, names=None):
+    # {'node': id, 'values': {name: value}} of every given node, in the given order; all nodes missing in the cache are
+    # read in one pipeline
+    self.check()
+    names  = tuple(sorted(names if names is not None else self.names()))
+    values = dict((node, self.cache.lookup(('node', node, names), missing)) for node in nodes)
+    absent = sorted(node for node in values if values[node] is missing)
+    if absent:
+      for node, row in zip(absent, self.fetch_nodes(absent, names)):
+        self.cache.put(('node', node, names), row)
+        values[node] = row
+    return [{'node': node, 'values': values[node]} for node in nodes]
+
+  def neighborhood(self, node, names=None):
+    # the node and its neighbors with their values, by default all scores
+    self.check()
+    if names is None:
+      names = [name for name in self.names() if name in self.cache.get(('scores',), self.fetch_scores)]
+    neighbors = self.cache.get(('neighbors', node), lambda: self.fetch_neighbors(node))
+    values    = self.nodes([node] + neighbors, names)
+    return {'node': values[0], 'neighbors': values[1:]}
+
+  #############
+  # reads
+  #############
+
+  def fetch_scores(self):
+    return set(self.redis.smembers(self.score_index_key))
+
+  def fetch_names(self):
+    pipe = self.redis.pipeline(transaction=False)
+    pipe.smembers(self.metric_index_key)
+    pipe.smembers(self.score_index_key)
+    metrics, scores = pipe.execute()
+    return sorted(list(metrics) + [metric+self.normalization_suffix for metric in metrics] + list(scores))
+
+  def sorted_set(self, name):
+    # key of the sorted set of a column, None if the column has no sorted set
+    pipe = self.redis.pipeline(transaction=False)
+    pipe.exists(self.metric_prefix+name)
+    pipe.exists(self.score_prefix+name)
+    is_metric, is_score = pipe.execute()
+    if is_metric:
+      return self.metric_prefix+name
+    if is_score:
+      return self.score_prefix+name
+    return None
+
+  def column(self, name):
+    # all values of a column of the compact layout, ordered like the node ids of the reader
+    return self.cache.get(('column', name), lambda: self.compact_reader().column(name))
+
+  def fetch_top(self, name, k):
+    key = self.sorted_set(name)
+    if key is not None:
+      return [[int(node), value] for node, value in self.redis.zrevrange(key, 0, k - 1, withscores=True)]
+    if self.storage_layout != 'compact':
+      raise KeyError(name)
+
+    # columns without a sorted set, largest values first and ties by ascending node id
+    values = self.column(name)
+    nodes  = self.compact_reader().nodes
+    order  = np.lexsort((nodes, -values))[:k]
+    return [[int(node), float(value)] for node, value in zip(nodes[order], values[order])]
+
+  def fetch_percentile_rank(self, node, name):
+    key = self.sorted_set(name)
+    if key is None:
+      if self.storage_layout != 'compact':
+        raise KeyError(name)
+      values = self.column(name)
+      value  = values[self.compact_reader().position(node)]
+      less, equal, total = np.count_nonzero(values < value), np.count_nonzero(values == value), len(values)
+    else:
+      value = self.redis.zscore(key, str(node))
+      if value is None:
+        raise KeyError(node)
+      pipe = self.redis.pipeline(transaction=False)
+      pipe.zcount(key, '-inf', '(%r' % value)
+      pipe.zcount(key, repr(value), repr(value))
+      pipe.zcard(key)
+      less, equal, total = pipe.execute()
+
+    if total < 2:
+      return 1.0
+    return (less + (equal - 1) / 2.0) / (total - 1)
+
+  def fetch_nodes(self, nodes, names):
+    if self.storage_layout == 'compact':
+      return self.compact_reader().values_of(nodes, names)
+
+    pipe = self.redis.pipeline(transaction=False)
+    for node in nodes:
+      pipe.hmget(self.node_prefix+str(node), names)
+    rows = []
+    for node, values in zip(nodes, pipe.execute()):
+      if all(value is None for value in values):
+        raise KeyError(node)
+      rows.append(dict((name, float(value)) for name, value in zip(names, values) if value is not None))
+    return rows
+
+  def fetch_neighbors(self, node):
+    if self.storage_layout == 'compact':
+      return sorted(self.compact_reader().neighbors(node))
+
+    pipe = self.redis.pipeline(transaction=False)
+    pipe.exists(self.node_prefix+str(node))
+    pipe.smembers(self.node_neighbors_prefix+str(node))
+    exists, neighbors = pipe.execute()
+    if not exists:
+      raise KeyError(node)
+    return sorted(int(neighbor) for neighbor in neighbors)
+
+
+#############
+# http service
+#############
+# GET /names
+# GET /top?name=<name>&k=<k>[&details=1]
+# GET /percentile_rank?node=<id>&name=<name>
+# GET /nodes?ids=<id>,<id>,...[&names=<name>,<name>,...]
+# GET /neighborhood?node=<id>[&names=<name>,<name>,...]
+
+class QueryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  query = None
+
+  def do_GET(self):
+    url        = urlparse.urlparse(self.path)
+    parameters = dict((key, values[-1]) for key, values in urlparse.parse_qs(url.query).items())
+    required   = lambda name: parameter(parameters, name)
+    routes     = {'/names'          : lambda: self.query.names(),
+                  '/top'            : lambda: self.query.top(required('name'), int(parameters.get('k', 10)), parameters.get('details') == '1'),
+                  '/percentile_rank': lambda: self.query.percentile_rank(int(required('node')), required('name')),
+                  '/nodes'          : lambda: self.query.nodes(ids(required('ids')), names(parameters)),
+                  '/neighborhood'   : lambda: self.query.neighborhood(int(required('node')), names(parameters))}
+
+    if url.path not in routes:
+      return self.respond(404, {'error': 'unknown query %s' % url.path})
+    try:
+      self.respond(200, routes[url.path]())
+    except KeyError as error:
+      # unknown nodes and columns
+      self.respond(404, {'error': 'not found: %s' % error.args[0]})
+    except ValueError as error:
+      self.respond(400, {'error': str(error)})
+
+  def respond(self, status, body):
+    data = json.dumps(body)
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def log_message(self, format, *args):
+    pass
+
+
+def parameter(parameters, name):
+  if name not in parameters:
+    raise ValueError('missing parameter %s' % name)
+  return parameters[name]
+
+def ids(text):
+  return [int(node) for node in text.split(',') if node]
+
+def names(parameters):
+  if 'names' not in parameters:
+    return None
+  return [name for name in parameters['names'].split(',') if name]
+
+
+def serve(query, host=config.query_host, port=config.query_port):
+  QueryHandler.query = query
+  server = BaseHTTPServer.HTTPServer((host, port), QueryHandler)
+  try:
+    server.serve_forever()
+  finally:
+    server.server_close()
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Serve queries on the results in redis as json over http')
+
+  parser.add_argument('--host', dest='host', type=str, default=config.query_host, help='address to listen on (default: %s)' % config.query_host)
+
+  parser.add_argument('--port', dest='port', type=int, default=config.query_port, help='port to listen on (default: %d)' % config.query_port)
+
+  args = parser.parse_args()
+
+  serve(Query(), args.host, args.port)
@@ -0,0 +1,149 @@
+#redis_writer.py
+import threading
+import config
+
+class RedisWriter(object):
+  # collects all per-node results of a stage in memory and sends them to redis in bulk
+  # node hashes are written with one multi-field HMSET per key, sorted sets and sets with multi-member ZADD/SADD,
+  # strings (the packed columns of the compact layout) with SET
+  # commands are sent through non-transactional pipelines of at most batch_size commands each
+
+  def __init__(self, redis, batch_size=config.redis_batch_size):
+    self.redis        = redis
+    self.batch_size   = batch_size
+
+    # buffered writes, keyed by redis key
+    self.hashes       = {}
+    self.sorted_sets  = {}
+    self.sets         = {}
+    self.strings      = {}
+
+    # buffered removals, which are sent before all writes of the same flush
+    self.deleted          = []
+    self.removed_sorted   = {}
+    self.removed_members  = {}
+
+    # number of pipeline executions (= network round trips) per stage, in order of the stages
+    self.stages       = []
+    self.round_trips  = {}
+
+    # totals over all stages, the payload size counts the keys and the encoded arguments of every command
+    self.total_round_trips = 0
+    self.commands_sent     = 0
+    self.bytes_sent        = 0
+
+    # the same totals for every thread which flushed, for stages measured per thread (see instrumentation.py)
+    self.thread_totals     = threading.local()
+
+  def hset(self, key, field, value):
+    self.hashes.setdefault(key, {})[field] = value
+
+  def zadd(self, key, value, member):
+    # same argument order as StrictRedis.zadd: score first, then member
+    self.sorted_sets.setdefault(key, []).extend((value, member))
+
+  def sadd(self, key, *members):
+    self.sets.setdefault(key, []).extend(members)
+
+  def set(self, key, value):
+    self.strings[key] = value
+
+  def delete(self, *keys):
+    self.deleted.extend(keys)
+
+  def zrem(self, key, *members):
+    self.removed_sorted.setdefault(key, []).extend(members)
+
+  def srem(self, key, *members):
+    self.removed_members.setdefault(key, []).extend(members)
+
+  def flush(self, stage):
+    # send all buffered writes and count the round trips for the given stage
+    pipe     = self.redis.pipeline(transaction=False)
+    queued   = 0
+    executed = 0
+    commands_before, bytes_before = self.commands_sent, self.bytes_sent
+
+    for command, key, args in self.commands():
+      getattr(pipe, command)(key, *args)
+      self.commands_sent += 1
+      self.bytes_sent    += payload_size(key, args)
+      queued += 1
+      if queued == self.batch_size:
+        pipe.execute()
+        executed += 1
+        queued = 0
+
+    if queued > 0:
+      pipe.execute()
+      executed += 1
+
+    self.hashes      = {}
+    self.sorted_sets = {}
+    self.sets        = {}
+    self.strings     = {}
+
+    self.deleted         = []
+    self.removed_sorted  = {}
+    self.removed_members = {}
+
+    if stage not in self.round_trips:
+      self.stages.append(stage)
+      self.round_trips[stage] = 0
+    self.round_trips[stage] += executed
+    self.total_round_trips  += executed
+
+    commands, size = self.commands_sent - commands_before, self.bytes_sent - bytes_before
+    thread_totals  = self.thread_totals
+    thread_totals.round_trips   = getattr(thread_totals, 'round_trips', 0) + executed
+    thread_totals.commands_sent = getattr(thread_totals, 'commands_sent', 0) + commands
+    thread_totals.bytes_sent    = getattr(thread_totals, 'bytes_sent', 0) + size
+
+  def thread_traffic(self):
+    # (commands, bytes, round trips) sent by flushes of the calling thread
+    thread_totals = self.thread_totals
+    return (getattr(thread_totals, 'commands_sent', 0), getattr(thread_totals, 'bytes_sent', 0),
+            getattr(thread_totals, 'round_trips', 0))
+
+  def commands(self):
+    # generator over all buffered writes, split into commands of at most batch_size members
+    # removals come first, so that a key can be deleted and written again within one flush
+    for i in range(0, len(self.deleted), self.batch_size):
+      yield 'delete', self.deleted[i], self.deleted[i + 1:i + self.batch_size]
+
+    for key in self.removed_sorted:
+      members = self.removed_sorted[key]
+      for i in range(0, len(members), self.batch_size):
+        yield 'zrem', key, members[i:i + self.batch_size]
+
+    for key in self.removed_members:
+      members = self.removed_members[key]
+      for i in range(0, len(members), self.batch_size):
+        yield 'srem', key, members[i:i + self.batch_size]
+
+    for key in self.strings:
+      yield 'set', key, (self.strings[key],)
+
+    for key in self.hashes:
+      yield 'hmset', key, (self.hashes[key],)
+
+    for key in self.sorted_sets:
+      args = self.sorted_sets[key]
+      # two arguments (score, member) per sorted set member
+      for i in range(0, len(args), 2 * self.batch_size):
+        yield 'zadd', key, args[i:i + 2 * self.batch_size]
+
+    for key in self.sets:
+      members = self.sets[key]
+      for i in range(0, len(members), self.batch_size):
+        yield 'sadd', key, members[i:i + self.batch_size]
+
+
+def payload_size(key, args):
+  size = len(key)
+  for arg in args:
+    if isinstance(arg, dict):
+      size += sum(len(str(field)) + len(repr(value) if isinstance(value, float) else str(value)) for field, value in arg.iteritems())
+    else:
+      size += len(repr(arg) if isinstance(arg, float) else str(arg))
+  return size
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+import json
+import datetime
+import argparse
+import numpy as np
+import redis as rd
+import config
+import scoring
+import compact
+import versions
+import statistics
+from column_store import ColumnStore
+from redis_writer import RedisWriter
+
+# recalculates weighted scores with new weights from the normalized metrics published in redis, without calculating any
+# graph metric again; advanced scores depending on a recalculated score are recalculated as well
+# scores with new names are published next to the existing ones, so that alternative weightings can be compared
+# with versioned publishing, the live run is copied to the namespace of a new run, which is rescored and then made live
+# like a calculated run (see versions.py), so readers never see partly rescored results; otherwise the scores are
+# replaced in place
+
+
+class Rescorer(object):
+
+  def __init__(self, scores, redis=None):
+    # scores has the same form as config.scores: {score name: {metric name: weight}}
+    self.scores                = scores
+    self.redis                 = redis if redis is not None else rd.StrictRedis(host='localhost', port=6379, db=0)
+    self.writer                = RedisWriter(self.redis)
+
+    # with versioned publishing, the run the new version is copied from, None without a live versioned run
+    self.run_id                = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    self.source_run            = self.redis.get(config.live_run_key) if config.versioned_publishing else None
+    self.namespace             = versions.namespace(self.run_id) if self.source_run is not None else ''
+
+    self.node_prefix           = self.namespace+config.node_prefix
+    self.metric_prefix         = self.namespace+config.metric_prefix
+    self.score_prefix          = self.namespace+config.score_prefix
+    self.statistics_prefix     = self.namespace+config.statistics_prefix
+    self.score_index_key       = self.namespace+config.score_index_key
+    self.normalization_suffix  = config.normalization_suffix
+    self.advanced_scores       = config.advanced_scores
+    self.dependencies          = config.dependencies
+
+    self.storage_layout        = config.storage_layout
+    self.compact_prefix        = self.namespace+config.compact_prefix
+    self.compact_dtype         = config.compact_dtype
+    self.ranked_metrics        = config.ranked_metrics
+    self.published_run_key     = config.published_run_key
+
+    self.nodes                 = None
+    self.columns               = None
+
+  def start(self):
+    # the new version starts as a complete copy of the live run, registered before anything is written
+    if self.source_run is not None:
+      versions.register(self.redis, self.run_id)
+      versions.copy_namespace(self.redis, versions.namespace(self.source_run), self.namespace, self.writer.batch_size)
+
+    # advanced scores reading any of the recalculated scores are recalculated after them
+    advanced_scores = [name for name in sorted(self.advanced_scores) if set(self.dependencies.get(name, [])) & set(self.scores)]
+
+    required = set(metric+self.normalization_suffix for score_name in self.scores for metric in self.scores[score_name])
+    for name in advanced_scores:
+      required.update(dependency for dependency in self.dependencies.get(name, []) if dependency not in self.scores)
+    self.load(sorted(required))
+
+    scoring.weighted_scores(self, self.scores)
+    for name in advanced_scores:
+      self.columns[name] = self.advanced_scores[name](self)
+
+    self.publish(sorted(self.scores) + advanced_scores)
+    self.activate()
+
+  def activate(self):
+    # makes the new version live, unless another run was made live in the meantime, and deletes older versions
+    # in place, the rescored results count as a new run for the caches of the query layer
+    if self.source_run is not None:
+      versions.activate(self.redis, self.run_id, self.source_run)
+      versions.cleanup(self.redis)
+    else:
+      self.redis.set(self.published_run_key, 'rescore_'+self.run_id)
+
+  def load(self, names):
+    # columns of the given normalized metrics or scores, read from their sorted sets with one command each
+    # (or from their packed columns in the compact layout); all sorted sets hold the same nodes, ordered by node id
+    if self.storage_layout == 'compact':
+      reader       = compact.CompactReader(self.redis, self.compact_prefix)
+      self.nodes   = reader.nodes.tolist()
+      self.columns = ColumnStore(len(self.nodes), summarize=False)
+      for name in names:
+        self.columns[name] = reader.column(name)
+      return
+
+    for name in names:
+      key     = self.metric_prefix+name if self.redis.exists(self.metric_prefix+name) else self.score_prefix+name
+      members = self.redis.zrange(key, 0, -1, withscores=True)
+      if not members:
+        raise ValueError('no published values for %s' % name)
+
+      ids    = np.array([int(member) for member, _ in members], dtype=np.int64)
+      values = np.array([value for _, value in members], dtype=np.float64)
+      order  = np.argsort(ids)
+
+      if self.columns is None:
+        self.nodes   = ids[order].tolist()
+        self.columns = ColumnStore(len(self.nodes), summarize=False)
+      elif not np.array_equal(ids[order], self.nodes):
+        raise ValueError('%s is not published for the same nodes as the other columns' % key)
+      self.columns[name] = values[order]
+
+  def publish(self, names):
+    for name in names:
+      statistics.calculate_statistics(self, name)
+      self.writer.sadd(self.score_index_key, name)
+      if self.storage_layout == 'compact':
+        self.writer.set(compact.column_key(self.compact_prefix, name), compact.pack(self.columns[name], self.compact_dtype))
+        if name in self.ranked_metrics:
+          self.writer.delete(self.score_prefix+name)
+          for node, value in zip(self.nodes, self.columns[name].tolist()):
+            self.writer.zadd(self.score_prefix+name, value, str(node))
+        self.writer.flush('rescore')
+        continue
+
+      for node, value in zip(self.nodes, self.columns[name].tolist()):
+        self.writer.hset(self.node_prefix+str(node), name, value)
+        self.writer.zadd(self.score_prefix+name, value, str(node))
+      self.writer.flush('rescore')
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Recalculate scores with new weights from the normalized metrics in redis')
+
+  parser.add_argument('--weights', dest='weights', type=str,
+                      help='json object {score name: {metric name: weight}}, a score with a new name is published alongside the others (default: scores in config.py)')
+
+  args = parser.parse_args()
+
+  Rescorer(json.loads(args.weights) if args.weights else config.scores).start()
@@ -0,0 +1,75 @@
+#scheduler.py
+import Queue
+import traceback
+from multiprocessing.pool import ThreadPool
+
+class Scheduler(object):
+  # runs a graph of named tasks, every task starts as soon as all tasks it depends on are finished
+  # independent tasks run concurrently on a pool of threads; the heavy graph work inside the tasks is
+  # done by numpy/scipy and the worker process pool, so threads mainly keep the process pool busy
+
+  def __init__(self, threads=1):
+    self.threads = max(1, threads)
+    self.tasks   = {}
+    self.order   = []
+
+  def add(self, name, function, dependencies=()):
+    # function is called without arguments
+    if name in self.tasks:
+      raise ValueError('task %s is defined twice' % name)
+    self.tasks[name] = (function, list(dependencies))
+    self.order.append(name)
+
+  def validate(self):
+    # every dependency must be a task and the dependencies must not contain cycles
+    for name in self.order:
+      for dependency in self.tasks[name][1]:
+        if dependency not in self.tasks:
+          raise ValueError('task %s depends on unknown task %s' % (name, dependency))
+
+    remaining = dict((name, set(self.tasks[name][1])) for name in self.order)
+    while remaining:
+      ready = [name for name in remaining if not remaining[name]]
+      if not ready:
+        raise ValueError('cyclic dependencies between tasks %s' % ', '.join(sorted(remaining)))
+      for name in ready:
+        del remaining[name]
+      for name in remaining:
+        remaining[name].difference_update(ready)
+
+  def run(self):
+    self.validate()
+
+    waiting  = dict((name, set(self.tasks[name][1])) for name in self.order)
+    finished = Queue.Queue()
+    pool     = ThreadPool(self.threads) if self.threads > 1 else None
+    running  = 0
+
+    def execute(name):
+      try:
+        self.tasks[name][0]()
+        finished.put((name, None))
+      except Exception:
+        finished.put((name, traceback.format_exc()))
+
+    try:
+      while waiting or running:
+        # start every task whose dependencies are finished, in the order the tasks were added
+        for name in [name for name in self.order if name in waiting and not waiting[name]]:
+          del waiting[name]
+          running += 1
+          if pool is None:
+            execute(name)
+          else:
+            pool.apply_async(execute, (name,))
+
+        name, error = finished.get()
+        running -= 1
+        if error is not None:
+          raise RuntimeError('task %s failed:\n%s' % (name, error))
+        for dependencies in waiting.values():
+          dependencies.discard(name)
+    finally:
+      if pool is not None:
+        pool.close()
+        pool.join()
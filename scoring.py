@@ -0,0 +1,25 @@
+#scoring.py
+import numpy as np
+
+# weighted scores are linear combinations of normalized metric columns, all of them are calculated as one matrix product:
+# the normalized columns side by side (one row per node) times the weight matrix (one row per metric, one column per score)
+
+def weight_matrix(scores):
+  # names of the scores, names of all metrics weighted by any of them and the weight matrix, metrics not weighted by a score
+  # get the weight 0 for it
+  score_names  = sorted(scores)
+  metric_names = sorted(set(metric for score_name in score_names for metric in scores[score_name]))
+  weights      = np.zeros((len(metric_names), len(score_names)), dtype=np.float64)
+  for j, score_name in enumerate(score_names):
+    for metric, weight in scores[score_name].items():
+      weights[metric_names.index(metric), j] = weight
+  return score_names, metric_names, weights
+
+def weighted_scores(self, scores):
+  # calculates the given scores ({score name: {metric name: weight}}) from the normalized metric columns and stores their columns
+  score_names, metric_names, weights = weight_matrix(scores)
+  if not score_names:
+    return
+  values = self.columns.matrix([metric+self.normalization_suffix for metric in metric_names]).dot(weights)
+  for j, score_name in enumerate(score_names):
+    self.columns[score_name] = values[:, j]
@@ -0,0 +1,265 @@
+#shortest_paths.py
+import numpy as np
+from scipy.sparse.csgraph import shortest_path
+import parallel
+import components
+
+# shortest path engine shared by eccentricity, average shortest path length and betweenness centrality
+# a single breadth first search per source yields the eccentricity of the source, the sum of its distances
+# and (Brandes' algorithm) the dependencies of all other nodes on the source
+
+def single_source(neighbors, source, dependencies=None, squares=None):
+  # breadth first search from source over the neighbor lists (positions)
+  # returns the eccentricity of source, the sum of all distances from source and the number of reached nodes
+  # (source included); if a dependency list is given, the dependencies of all nodes on source are added to it
+  # and if a list of squares is given as well, so are the squared dependencies
+  distance  = {source: 0}
+  sigma     = {source: 1.0}
+  order     = [source]
+
+  for v in order:
+    next_distance = distance[v] + 1
+    for w in neighbors[v]:
+      if w not in distance:
+        distance[w] = next_distance
+        sigma[w]    = 0.0
+        order.append(w)
+      if distance[w] == next_distance:
+        sigma[w] += sigma[v]
+
+  if dependencies is not None:
+    # accumulation in order of non-increasing distance from source
+    delta = dict.fromkeys(order, 0.0)
+    for w in reversed(order):
+      coefficient       = (1.0 + delta[w]) / sigma[w]
+      previous_distance = distance[w] - 1
+      for v in neighbors[w]:
+        if distance.get(v) == previous_distance:
+          delta[v] += sigma[v] * coefficient
+      if w != source:
+        dependencies[w] += delta[w]
+        if squares is not None:
+          squares[w] += delta[w] * delta[w]
+
+  eccentricity = distance[order[-1]]
+  distance_sum = sum(distance.itervalues())
+  return eccentricity, distance_sum, len(order)
+
+
+def source_chunk(adjacency, sources):
+  # runs the single source search for a chunk of source positions (one task of the worker pool)
+  # returns the eccentricities, distance sums and reached node counts of the sources, in the order of the chunk,
+  # and the unscaled dependencies of all nodes on the sources of the chunk
+  neighbors      = adjacency.neighbor_lists()
+  eccentricities = np.zeros(len(sources), dtype=np.int64)
+  distance_sums  = np.zeros(len(sources), dtype=np.int64)
+  reached        = np.zeros(len(sources), dtype=np.int64)
+  dependencies   = [0.0] * adjacency.number_of_nodes()
+
+  for i, source in enumerate(sources):
+    eccentricities[i], distance_sums[i], reached[i] = single_source(neighbors, source, dependencies)
+
+  return eccentricities, distance_sums, reached, np.array(dependencies, dtype=np.float64)
+
+
+def distance_chunk(adjacency, sources):
+  # same as source_chunk without the dependency accumulation, the returned dependencies are None
+  neighbors      = adjacency.neighbor_lists()
+  eccentricities = np.zeros(len(sources), dtype=np.int64)
+  distance_sums  = np.zeros(len(sources), dtype=np.int64)
+  reached        = np.zeros(len(sources), dtype=np.int64)
+
+  for i, source in enumerate(sources):
+    eccentricities[i], distance_sums[i], reached[i] = single_source(neighbors, source)
+
+  return eccentricities, distance_sums, reached, None
+
+
+def pivot_chunk(adjacency, sources):
+  # dependencies and squared dependencies of all nodes on a chunk of sampled pivot sources
+  neighbors    = adjacency.neighbor_lists()
+  dependencies = [0.0] * adjacency.number_of_nodes()
+  squares      = [0.0] * adjacency.number_of_nodes()
+
+  for source in sources:
+    single_source(neighbors, source, dependencies, squares)
+
+  return np.array(dependencies, dtype=np.float64), np.array(squares, dtype=np.float64)
+
+
+def all_sources(self, with_dependencies=True):
+  # results of the nodes of complete and star components are known in closed form (see components.py), the search runs
+  # from every other node, component by component, split into chunks of sources which are processed by the worker pool
+  # returns arrays indexed by position: eccentricities, distance sums, reached node counts and the summed
+  # unscaled dependencies of all nodes (None without dependencies), partial dependencies are added up in chunk order
+  labels, sizes = components.label(self.adjacency)
+  solved, eccentricities, distance_sums, reached, dependencies = components.closed_forms(self.adjacency, labels, sizes)
+
+  sources = components.search_order(labels, sizes, ~solved)
+  chunk   = source_chunk if with_dependencies else distance_chunk
+  parts   = self.pool.map(chunk, self.adjacency, parallel.chunks(sources.tolist(), self.source_chunk_size))
+
+  if parts:
+    eccentricities[sources] = np.concatenate([part[0] for part in parts])
+    distance_sums[sources]  = np.concatenate([part[1] for part in parts])
+    reached[sources]        = np.concatenate([part[2] for part in parts])
+  if not with_dependencies:
+    return eccentricities, distance_sums, reached, None
+
+  for part in parts:
+    dependencies += part[3]
+  return eccentricities, distance_sums, reached, dependencies
+
+
+def betweenness_scale(n):
+  # same normalization as networkx: shortest paths between all ordered pairs of the other n-1 nodes
+  if n <= 2:
+    return 1.0
+  return 1.0 / ((n - 1) * (n - 2))
+
+
+def sweep(self):
+  # one pass over all sources, results are cached on the instance like the other whole graph metrics
+  # exact betweenness centralities are accumulated in the same pass, approximated ones are sampled separately
+  exact = self.betweenness_mode == 'exact'
+  eccentricities, distance_sums, reached, dependencies = all_sources(self, exact)
+
+  average_shortest_path_lengths = distance_sums / reached.astype(np.float64)
+
+  # distances are measured within the component of every node, normalized against the whole graph as configured
+  self.all_eccentricities                = components.normalize_distances(self.distance_normalization, eccentricities, reached)
+  self.all_average_shortest_path_lengths = components.normalize_distances(self.distance_normalization, average_shortest_path_lengths, reached)
+  if exact:
+    self.all_betweenness_centralities    = dependencies * betweenness_scale(len(reached))
+    store_betweenness_sampling(self, {'mode': 'exact', 'pivots': len(reached), 'error_estimate': 0.0})
+
+
+#############
+# eccentricities by bounding (Takes & Kosters)
+#############
+# the distances d from a root v bound the eccentricity of every node w of its component: max(d(w), ecc(v) - d(w)) <= ecc(w)
+# and ecc(w) <= ecc(v) + d(w); roots are chosen alternately as the node with the largest upper and the smallest lower
+# bound (ties broken by the larger degree) among the nodes whose bounds differ, until all bounds meet; of all nodes with
+# the same single neighbor only one is kept, the others have the same eccentricity
+# on real networks this needs a small fraction of the searches of the sweep and gives the same exact eccentricities
+# complete and star components need no search (see components.py), components with less than
+# bounding_min_component_size nodes are searched from every node, which is cheaper than bounding their few nodes
+# the searches are only saved if no metric needs the sweep (average shortest path length, exact betweenness centrality)
+
+def bounding_eccentricities(self):
+  labels, sizes = components.label(self.adjacency)
+  solved, eccentricities, _, _, _ = components.closed_forms(self.adjacency, labels, sizes)
+
+  small    = ~solved & (sizes < self.bounding_min_component_size)
+  sources  = components.search_order(labels, sizes, small)
+  parts    = self.pool.map(distance_chunk, self.adjacency, parallel.chunks(sources.tolist(), self.source_chunk_size))
+  if parts:
+    eccentricities[sources] = np.concatenate([part[0] for part in parts])
+  searches = len(sources)
+
+  matrix   = self.adjacency.matrix()
+  degrees  = self.adjacency.degrees()
+  large    = components.search_order(labels, sizes, ~solved & ~small)
+
+  # nodes of degree one (self loops aside) which share their neighbor with a node of degree one at a lower position
+  # are represented by that node, which is the first of them
+  rows     = np.repeat(np.arange(len(labels)), np.diff(self.adjacency.indptr))
+  simple   = rows != self.adjacency.indices
+  leaves   = np.flatnonzero(np.bincount(rows[simple], minlength=len(labels)) == 1)
+  neighbors_of_leaves = self.adjacency.indices[simple][np.searchsorted(rows[simple], leaves)]
+  _, first = np.unique(neighbors_of_leaves, return_index=True)
+  representative = -np.ones(len(labels), dtype=np.int64)
+  representative[leaves] = leaves[first][np.searchsorted(np.unique(neighbors_of_leaves), neighbors_of_leaves)]
+  representative[representative == np.arange(len(labels))] = -1
+
+  for component in np.unique(labels[large]).tolist():
+    component_members = np.flatnonzero(labels == component)
+    pruned  = component_members[representative[component_members] >= 0]
+    members = component_members[representative[component_members] < 0]
+    lower   = np.zeros(len(members))
+    upper   = np.empty(len(members))
+    upper.fill(np.inf)
+    open_bounds = np.ones(len(members), dtype=bool)
+    highest     = True
+
+    while open_bounds.any():
+      candidates = np.flatnonzero(open_bounds)
+      if highest:
+        root = candidates[np.lexsort((-degrees[members[candidates]], -upper[candidates]))[0]]
+      else:
+        root = candidates[np.lexsort((-degrees[members[candidates]], lower[candidates]))[0]]
+      highest = not highest
+
+      distances = shortest_path(matrix, method='D', unweighted=True, indices=members[root])
+      root_eccentricity = distances[component_members].max()
+      distances = distances[members]
+      searches += 1
+
+      lower = np.maximum(lower, np.maximum(distances, root_eccentricity - distances))
+      upper = np.minimum(upper, root_eccentricity + distances)
+      lower[root] = upper[root] = root_eccentricity
+      open_bounds &= lower != upper
+
+    eccentricities[members] = lower
+    eccentricities[pruned]  = eccentricities[representative[pruned]]
+
+  # kept apart from the eccentricities of the sweep, which runs anyway for other metrics
+  self.bounded_eccentricities = components.normalize_distances(self.distance_normalization, eccentricities, sizes)
+
+  # number of breadth first searches compared to the searches of the sweep, checkpointed with the eccentricities
+  bounding = {'searches': searches, 'nodes': self.adjacency.number_of_nodes()}
+  for field in bounding:
+    self.writer.hset(self.eccentricity_bounding_key, field, bounding[field])
+  self.checkpoint_hashes['eccentricity'] = {self.eccentricity_bounding_key: bounding}
+
+
+def approximate_betweenness(self):
+  # betweenness centrality estimated from the dependencies on k pivot sources, sampled uniformly without replacement
+  # with a seeded random number generator and scaled up by n/k (Brandes & Pich)
+  # the error estimate is the largest standard error of any node's normalized estimate; with a target error
+  # configured, the sample is doubled (extending the same seeded permutation) until the estimate meets the target
+  n       = self.adjacency.number_of_nodes()
+  scale   = betweenness_scale(n)
+  pivots  = np.random.RandomState(self.betweenness_seed).permutation(n)
+  k       = min(self.betweenness_pivots, n)
+
+  sums    = np.zeros(n, dtype=np.float64)
+  squares = np.zeros(n, dtype=np.float64)
+  sampled = 0
+
+  while True:
+    parts = self.pool.map(pivot_chunk, self.adjacency, parallel.chunks(pivots[sampled:k].tolist(), self.source_chunk_size))
+    for part in parts:
+      sums    += part[0]
+      squares += part[1]
+    sampled = k
+
+    error = betweenness_error(sums, squares, k, n) * scale
+    if self.betweenness_target_error is None or error <= self.betweenness_target_error or k == n:
+      break
+    k = min(2 * k, n)
+
+  self.all_betweenness_centralities = sums * (float(n) / k) * scale
+
+  sampling = {'mode': 'approximate', 'pivots': k, 'seed': self.betweenness_seed, 'error_estimate': error}
+  if self.betweenness_target_error is not None:
+    sampling['target_error'] = self.betweenness_target_error
+  store_betweenness_sampling(self, sampling)
+
+
+def store_betweenness_sampling(self, sampling):
+  # sample size and error estimate, so that scores depending on betweenness centrality stay auditable
+  # kept with the checkpoint of betweenness centrality as well, so that a resumed run publishes it again
+  for field in sampling:
+    self.writer.hset(self.betweenness_sampling_key, field, sampling[field])
+  self.checkpoint_hashes['betweenness_centrality'] = {self.betweenness_sampling_key: sampling}
+
+
+def betweenness_error(sums, squares, k, n):
+  # largest standard error of the unscaled estimates n/k * sum, with finite population correction
+  if k >= n:
+    return 0.0
+  if k < 2:
+    return float('inf')
+  variances = np.maximum(squares - sums * sums / k, 0.0) / (k - 1)
+  return float(n * np.sqrt(np.max(variances) / k * (1.0 - float(k) / n)))
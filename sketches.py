@@ -0,0 +1,199 @@
+#sketches.py
+import math
+import numpy as np
+import config
+
+# mergeable one-pass summaries of columns (see statistics.py)
+# a Summary holds the count, exact minimum and maximum, mean and sum of squared deviations (merged with the update
+# formulas of Chan et al.) and a quantile sketch in the manner of DDSketch: values are counted in logarithmic buckets
+# (gamma**(i-1), gamma**i] with gamma = 1 + relative_accuracy; buckets only depend on the values, which makes summaries
+# of separate chunks (or workers) mergeable exactly
+# every bucket also keeps the observed value of the smallest magnitude in it, which is returned for quantiles: quantiles
+# are always values of the column (e.g. integer metrics get integer medians) within relative_accuracy of the exact one
+# a summary created with histogram edges also counts its values into these fixed bins exactly (see summarize)
+
+class Summary(object):
+
+  def __init__(self, relative_accuracy=None, edges=None):
+    # relative_accuracy defaults to sketch_relative_accuracy in config.py
+    relative_accuracy      = config.sketch_relative_accuracy if relative_accuracy is None else relative_accuracy
+    self.relative_accuracy = relative_accuracy
+    self.gamma             = 1.0 + relative_accuracy
+    self.log_gamma         = math.log(self.gamma)
+    # values closer to zero than the smallest normal float are counted as zero
+    self.min_indexable     = np.finfo(np.float64).tiny
+
+    self.count    = 0
+    self.mean     = 0.0
+    self.m2       = 0.0
+    self.min      = float('inf')
+    self.max      = float('-inf')
+    self.zeros    = 0
+    self.positive = {}
+    self.negative = {}
+
+    # smallest magnitude observed in every bucket, keyed like positive and negative
+    self.positive_lows = {}
+    self.negative_lows = {}
+
+    # exact histogram counts of the values between the given edges, None without edges
+    self.edges  = np.asarray(edges, dtype=np.float64) if edges is not None else None
+    self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64) if edges is not None else None
+
+  def add(self, values):
+    # adds an array of values
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if not len(values):
+      return self
+    chunk          = Summary(self.relative_accuracy, self.edges)
+    chunk.count    = len(values)
+    chunk.mean     = float(np.mean(values))
+    chunk.m2       = float(np.sum((values - chunk.mean) ** 2))
+    chunk.min      = float(np.min(values))
+    chunk.max      = float(np.max(values))
+    chunk.zeros    = int(np.count_nonzero(np.abs(values) < self.min_indexable))
+    chunk.positive, chunk.positive_lows = self.buckets(values[values >= self.min_indexable])
+    chunk.negative, chunk.negative_lows = self.buckets(-values[values <= -self.min_indexable])
+    if chunk.edges is not None:
+      chunk.counts = np.histogram(values, bins=chunk.edges)[0].astype(np.int64)
+    return self.merge(chunk)
+
+  def buckets(self, magnitudes):
+    # counts and smallest magnitudes of the buckets of the given magnitudes
+    indices = np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64)
+    order   = np.lexsort((magnitudes, indices))
+    indices, first, counts = np.unique(indices[order], return_index=True, return_counts=True)
+    lows    = magnitudes[order][first]
+    return dict(zip(indices.tolist(), counts.tolist())), dict(zip(indices.tolist(), lows.tolist()))
+
+  def merge(self, other):
+    # adds all values summarized by other, which must have the same relative accuracy
+    # exact histogram counts are kept if both summaries count into the same edges, otherwise they are dropped
+    if other.relative_accuracy != self.relative_accuracy or other.gamma != self.gamma:
+      raise ValueError('summaries with relative accuracies %r and %r cannot be merged' % (self.relative_accuracy, other.relative_accuracy))
+    if not other.count:
+      return self
+
+    if not self.count:
+      self.edges  = other.edges
+      self.counts = other.counts.copy() if other.counts is not None else None
+    elif self.edges is not None and other.edges is not None and np.array_equal(self.edges, other.edges):
+      self.counts = self.counts + other.counts
+    else:
+      self.edges  = self.counts = None
+
+    count     = self.count + other.count
+    delta     = other.mean - self.mean
+    self.mean = self.mean + delta * other.count / count
+    self.m2   = self.m2 + other.m2 + delta * delta * self.count * other.count / count
+    self.count = count
+    self.min  = min(self.min, other.min)
+    self.max  = max(self.max, other.max)
+    self.zeros += other.zeros
+    for buckets, others in ((self.positive, other.positive), (self.negative, other.negative)):
+      for index, bucket_count in others.items():
+        buckets[index] = buckets.get(index, 0) + bucket_count
+    for lows, others in ((self.positive_lows, other.positive_lows), (self.negative_lows, other.negative_lows)):
+      for index, low in others.items():
+        lows[index] = min(lows.get(index, low), low)
+    return self
+
+  def standard_deviation(self):
+    # population standard deviation, like numpy.std
+    return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+  def value(self, index):
+    # value representing a bucket, within relative_accuracy of every value in it
+    return 2.0 * self.gamma ** index / (self.gamma + 1.0)
+
+  def representatives(self):
+    # (value, count) of all buckets in ascending order of their values, the value is the observed value of the smallest
+    # magnitude in the bucket (sketches stored without it fall back to the value of the bucket, clamped to the exact
+    # minimum and maximum)
+    pairs  = [(-self.negative_lows.get(index, self.value(index)), self.negative[index]) for index in sorted(self.negative, reverse=True)]
+    pairs += [(0.0, self.zeros)] if self.zeros else []
+    pairs += [(self.positive_lows.get(index, self.value(index)), self.positive[index]) for index in sorted(self.positive)]
+    return [(min(max(value, self.min), self.max), bucket_count) for value, bucket_count in pairs]
+
+  def quantile(self, q):
+    # value of rank q * (count - 1) in ascending order, q between 0 and 1
+    if not self.count:
+      raise ValueError('quantile of an empty summary')
+    if q <= 0:
+      return self.min
+    if q >= 1:
+      return self.max
+    rank  = q * (self.count - 1)
+    total = 0
+    for value, bucket_count in self.representatives():
+      total += bucket_count
+      if total > rank:
+        return value
+    return self.max
+
+  def histogram(self, bins):
+    # counts of bins equal-width bins between minimum and maximum: the exact counts if the summary counted its values
+    # into these bins (see summarize), otherwise counts of the representatives of the buckets, which can be off for
+    # values within relative_accuracy of a bin edge
+    edges = np.linspace(self.min, self.max, bins + 1) if self.count else np.zeros(bins + 1)
+    if self.edges is not None and np.array_equal(self.edges, edges):
+      return edges, self.counts.copy()
+    pairs = self.representatives()
+    if not pairs:
+      return edges, np.zeros(bins, dtype=np.int64)
+    values, counts = zip(*pairs)
+    counts, _ = np.histogram(values, bins=edges, weights=counts)
+    return edges, counts.astype(np.int64)
+
+  def as_dict(self):
+    return {'relative_accuracy': self.relative_accuracy,
+            'count'            : self.count,
+            'mean'             : self.mean,
+            'm2'               : self.m2,
+            'min'              : self.min,
+            'max'              : self.max,
+            'zeros'            : self.zeros,
+            'gamma'            : self.gamma,
+            'positive'         : [[index, self.positive[index], self.positive_lows[index]] for index in sorted(self.positive)],
+            'negative'         : [[index, self.negative[index], self.negative_lows[index]] for index in sorted(self.negative)],
+            'edges'            : self.edges.tolist() if self.edges is not None else None,
+            'counts'           : self.counts.tolist() if self.counts is not None else None}
+
+  @classmethod
+  def from_dict(cls, data):
+    # also reads sketches stored without gamma (buckets of (1 + relative_accuracy) / (1 - relative_accuracy)), smallest
+    # magnitudes ([index, count] buckets) and histogram counts
+    summary = cls(data['relative_accuracy'], data.get('edges'))
+    summary.gamma     = data.get('gamma', (1.0 + summary.relative_accuracy) / (1.0 - summary.relative_accuracy))
+    summary.log_gamma = math.log(summary.gamma)
+    for name in ('count', 'mean', 'm2', 'min', 'max', 'zeros'):
+      setattr(summary, name, data[name])
+    summary.positive      = dict((bucket[0], bucket[1]) for bucket in data['positive'])
+    summary.negative      = dict((bucket[0], bucket[1]) for bucket in data['negative'])
+    summary.positive_lows = dict((bucket[0], bucket[2]) for bucket in data['positive'] if len(bucket) > 2)
+    summary.negative_lows = dict((bucket[0], bucket[2]) for bucket in data['negative'] if len(bucket) > 2)
+    if data.get('counts') is not None:
+      summary.counts = np.array(data['counts'], dtype=np.int64)
+    return summary
+
+
+def summarize(values, chunk_size=None, relative_accuracy=None, bins=None):
+  # summary of a column in one pass over chunks of values, which keeps the memory use of memory mapped (spilled)
+  # columns bounded; the values are also counted into bins equal-width bins between their minimum and maximum, which
+  # are found by a pass over the chunks before (see statistics.py)
+  # unset arguments are read from config (statistics_chunk_size, sketch_relative_accuracy, statistics_histogram_bins)
+  chunk_size        = config.statistics_chunk_size if chunk_size is None else chunk_size
+  relative_accuracy = config.sketch_relative_accuracy if relative_accuracy is None else relative_accuracy
+  bins              = config.statistics_histogram_bins if bins is None else bins
+
+  starts = range(0, len(values), chunk_size)
+  edges  = None
+  if len(values):
+    low   = min(float(np.min(values[start:start + chunk_size])) for start in starts)
+    high  = max(float(np.max(values[start:start + chunk_size])) for start in starts)
+    edges = np.linspace(low, high, bins + 1)
+
+  summary = Summary(relative_accuracy, edges)
+  for start in starts:
+    summary.add(values[start:start + chunk_size])
+  return summary
@@ -2,6 +2,8 @@
 import datetime
 import argparse
 import cProfile, pstats, StringIO
+import numpy as np
+import config
 from file_importer import FileImporter
 from metric_calculator import MetricCalculator
 
@@ -12,8 +14,23 @@ parser.add_argument('filename', metavar='filename', type=str,
 
 parser.add_argument('--profiling',dest='profiling',action='store_true', help='enable runtime profiling into profiling.txt file')
 
+parser.add_argument('--workers',dest='workers',type=int,default=1, help='number of worker processes for the graph metrics (default: 1)')
+
+parser.add_argument('--resume',dest='resume',action='store_true', help='read metrics from the checkpoints of earlier runs on the same graph, only calculate metrics whose checkpoint is missing or stale')
+
+parser.add_argument('--added',dest='added',type=str, help='file with edges added to the graph in filename, whose results are in redis: only the changes are calculated and written')
+
+parser.add_argument('--removed',dest='removed',type=str, help='file with edges removed from the graph in filename, see --added')
+
+parser.add_argument('--report',dest='report',type=str, help='write a json report with timings and resource usage of every stage to this file')
+
+parser.add_argument('--memory-budget',dest='memory_budget',type=int, help='memory available to the calculation in megabytes, enables the low memory mode (default: memory_budget_mb in config.py)')
+
 args = parser.parse_args()
 
+if args.memory_budget is not None:
+  config.memory_budget_mb = args.memory_budget
+
 if args.profiling:
   pr = cProfile.Profile()
   s = StringIO.StringIO()
@@ -22,9 +39,20 @@ if args.profiling:
   pr.enable()
 
 fi = FileImporter(args.filename)
-graph = fi.read()
-mc = MetricCalculator(graph)
-mc.start()
+adjacency = fi.read()
+if args.added or args.removed:
+  # the results of the graph in filename are read from its checkpoints, the changed graph is updated incrementally
+  added    = FileImporter(args.added).parse() if args.added else np.zeros((0, 2), dtype=np.int64)
+  removed  = FileImporter(args.removed).parse() if args.removed else np.zeros((0, 2), dtype=np.int64)
+  previous = MetricCalculator(adjacency, args.workers, resume=True)
+  mc = MetricCalculator(adjacency.with_changes(added, removed), args.workers, resume=args.resume)
+  mc.update(previous)
+else:
+  mc = MetricCalculator(adjacency, args.workers, resume=args.resume)
+  mc.start()
+
+if args.report:
+  mc.report.save(args.report)
 
 if args.profiling:
   ps = pstats.Stats(pr, stream=s).sort_stats('cumulative')
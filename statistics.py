@@ -1,22 +1,34 @@
 #statistics.py
+import json
 import redis as rd
 import numpy as np
-from scipy.stats import pearsonr
+from scipy.stats import rankdata
+from scipy.stats import t as t_distribution
+import config
 
-def calculate_statistics(self,metric,redis_key):
-  all_values = dict(self.redis.zrange(redis_key, 0, -1, withscores=True, score_cast_func=float)).values()
-  min_value = np.min(all_values)
-  max_value = np.max(all_values)
+# statistics of a column come from its one-pass summary (see sketches.py): minimum, maximum, average and standard
+# deviation are exact, the median and the statistics_percentiles are values of the column within the relative accuracy
+# of the sketch; the histogram (exact counts of statistics_histogram_bins equal-width bins between minimum and maximum)
+# and the sketch itself are stored as json, the sketch can be merged with others or asked for any percentile (see
+# sketches.Summary.from_dict)
 
-  average = np.average(all_values)
-  median = np.median(all_values)
-  standard_deviation = np.std(all_values)
+def calculate_statistics(self,metric):
+  summary = self.columns.summary(metric)
+  key     = self.statistics_prefix+metric
 
-  self.redis.hset(self.statistics_prefix+metric, 'min', min_value)
-  self.redis.hset(self.statistics_prefix+metric, 'max', max_value)
-  self.redis.hset(self.statistics_prefix+metric, 'average', average)
-  self.redis.hset(self.statistics_prefix+metric, 'median', median)
-  self.redis.hset(self.statistics_prefix+metric, 'standard_deviation', standard_deviation)
+  self.writer.hset(key, 'min', summary.min)
+  self.writer.hset(key, 'max', summary.max)
+  self.writer.hset(key, 'average', summary.mean)
+  self.writer.hset(key, 'median', summary.quantile(0.5))
+  self.writer.hset(key, 'standard_deviation', summary.standard_deviation())
+  self.writer.hset(key, 'count', summary.count)
+
+  for percentile in config.statistics_percentiles:
+    self.writer.hset(key, 'percentile_%g' % percentile, summary.quantile(percentile / 100.0))
+
+  edges, counts = summary.histogram(config.statistics_histogram_bins)
+  self.writer.hset(key, 'histogram', json.dumps({'edges': edges.tolist(), 'counts': counts.tolist()}))
+  self.writer.hset(key, 'sketch', json.dumps(summary.as_dict()))
 
 
 def calculate_correlations(self):
@@ -25,32 +37,35 @@ def calculate_correlations(self):
 
   metrics = m + c
 
-  correlations = {}
-  for metric1 in metrics:
-    correlations[metric1] = {}
-    for metric2 in metrics:
-      correlations[metric1][metric2] = (0,0)
-      if metric1 == metric2:
-        correlations[metric1][metric2] = (1,0)
-        continue
-
-      dict_metric1 = dict(self.redis.zrange(self.metric_prefix+metric1, 0, -1, withscores=True, score_cast_func=float))
-      dict_metric2 = dict(self.redis.zrange(self.metric_prefix+metric2, 0, -1, withscores=True, score_cast_func=float))
-      values_metric1 = []
-      values_metric2 = []
+  # all metric columns side by side (aligned by node position), correlated pairwise in one pass
+  # spearman's rank correlation is the pearson correlation of the ranks (ties get their average rank)
+  values = self.columns.matrix(metrics)
+  pearson, pearson_p = correlation_matrix(values)
+  spearman, spearman_p = correlation_matrix(np.apply_along_axis(rankdata, 0, values))
 
-      for key in sorted(dict_metric1.iterkeys()):
-        values_metric1.append(dict_metric1[key])
+  for i, source in enumerate(metrics):
+    for j, target in enumerate(metrics):
+      key = self.statistics_prefix+"correlations:"+source+":"+target
+      self.writer.hset(key, "correlation", pearson[i][j])
+      self.writer.hset(key, "confidence", pearson_p[i][j])
+      self.writer.hset(key, "spearman_correlation", spearman[i][j])
+      self.writer.hset(key, "spearman_confidence", spearman_p[i][j])
 
-      for key in sorted(dict_metric2.iterkeys()):
-        values_metric2.append(dict_metric2[key])
 
-      correlations[metric1][metric2] = pearsonr(values_metric1,values_metric2)
+def correlation_matrix(values):
+  # pearson correlation coefficients of all pairs of columns and their two-sided p-values,
+  # computed like scipy.stats.pearsonr from a t distribution with n-2 degrees of freedom
+  # every column is perfectly correlated with itself (coefficient 1, p-value 0)
+  n = values.shape[0]
+  centered = values - values.mean(axis=0)
+  norms = np.sqrt((centered * centered).sum(axis=0))
 
-  values_metric1 = []
-  values_metric2 = []
+  with np.errstate(invalid='ignore', divide='ignore'):
+    r = np.clip(centered.T.dot(centered) / np.outer(norms, norms), -1.0, 1.0)
+    degrees_of_freedom = n - 2
+    t = r * np.sqrt(degrees_of_freedom / ((1.0 - r) * (1.0 + r)))
+    p = 2 * t_distribution.sf(np.abs(t), degrees_of_freedom)
 
-  for source in correlations:
-    for target in correlations[source]:
-      self.redis.hset(self.statistics_prefix+"correlations:"+source+":"+target, "correlation", correlations[source][target][0])
-      self.redis.hset(self.statistics_prefix+"correlations:"+source+":"+target, "confidence", correlations[source][target][1])
\ No newline at end of file
+  np.fill_diagonal(r, 1.0)
+  np.fill_diagonal(p, 0.0)
+  return r, p
\ No newline at end of file
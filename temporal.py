@@ -0,0 +1,30 @@
+#temporal.py
+import numpy as np
+import statistics
+from incremental import positions_in
+
+# per-node changes of the scores between consecutive snapshots (see batch.py)
+# self is the calculator of a snapshot, self.baseline the calculator of the preceding snapshot with all its scores
+# for every score, the column <score><delta_suffix> holds the score of a node minus its score in the preceding snapshot
+# (0 for nodes which are new in the snapshot) and is published like the score itself; the ids of new and vanished nodes
+# are written to the sets delta_prefix+'added_nodes' and delta_prefix+'removed_nodes', the namespace of the preceding
+# snapshot to delta_prefix+'baseline'
+
+def score_deltas(self):
+  baseline = self.baseline
+  previous = positions_in(baseline.adjacency.nodes, self.adjacency.nodes)
+  kept     = previous >= 0
+
+  for name in sorted(self.scores.keys() + self.advanced_scores.keys()):
+    deltas       = np.zeros(len(self.nodes), dtype=np.float64)
+    deltas[kept] = self.columns[name][kept] - baseline.columns[name][previous[kept]]
+    self.columns[name+self.delta_suffix] = deltas
+    statistics.calculate_statistics(self, name+self.delta_suffix)
+
+  added   = self.adjacency.nodes[~kept].tolist()
+  removed = baseline.adjacency.nodes[positions_in(self.adjacency.nodes, baseline.adjacency.nodes) < 0].tolist()
+  if added:
+    self.writer.sadd(self.delta_prefix+'added_nodes', *added)
+  if removed:
+    self.writer.sadd(self.delta_prefix+'removed_nodes', *removed)
+  self.writer.set(self.delta_prefix+'baseline', baseline.namespace)
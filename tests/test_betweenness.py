@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+import numpy as np
+import networkx as nx
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import metrics
+from adjacency import Adjacency
+from metric_calculator import MetricCalculator
+
+
+class BetweennessTest(unittest.TestCase):
+
+  def setUp(self):
+    self.config = dict((name, getattr(config, name)) for name in ('betweenness_mode', 'betweenness_pivots', 'betweenness_seed', 'betweenness_target_error', 'store_checkpoints'))
+    config.store_checkpoints = False
+
+    # two components, so that some pivots reach only a part of the graph
+    self.graph = nx.disjoint_union(nx.barabasi_albert_graph(200, 2, seed=7), nx.connected_watts_strogatz_graph(50, 4, 0.2, seed=7))
+    exact      = nx.betweenness_centrality(self.graph)
+    self.exact = np.array([exact[node] for node in sorted(self.graph)])
+
+  def tearDown(self):
+    for name, value in self.config.items():
+      setattr(config, name, value)
+
+  def betweenness(self, mode, pivots=None, seed=42, target_error=None):
+    # betweenness centralities ordered like the nodes and the stored sampling information
+    config.betweenness_mode, config.betweenness_pivots, config.betweenness_seed, config.betweenness_target_error = mode, pivots, seed, target_error
+    mc = MetricCalculator(Adjacency.from_edges(np.array(self.graph.edges(), dtype=np.int64)), 1)
+    try:
+      values = metrics.betweenness_centrality(mc)
+    finally:
+      mc.close_pool()
+    return values, mc.checkpoint_hashes.get('betweenness_centrality', {}).get(mc.betweenness_sampling_key)
+
+  def test_exact(self):
+    values, sampling = self.betweenness('exact')
+    np.testing.assert_allclose(values, self.exact, atol=1e-12)
+    self.assertEqual(sampling['mode'], 'exact')
+    self.assertEqual(sampling['error_estimate'], 0.0)
+
+  def test_all_pivots_are_exact(self):
+    values, sampling = self.betweenness('approximate', 1000)
+    np.testing.assert_allclose(values, self.exact, atol=1e-12)
+    self.assertEqual(sampling, {'mode': 'approximate', 'pivots': 250, 'seed': 42, 'error_estimate': 0.0})
+
+  def test_sampled_pivots(self):
+    values, sampling = self.betweenness('approximate', 100)
+    self.assertEqual((sampling['pivots'], sampling['seed']), (100, 42))
+    self.assertGreater(sampling['error_estimate'], 0.0)
+    # within a few standard errors of the exact values, and the central nodes are found
+    self.assertLess(np.max(np.abs(values - self.exact)), 4 * sampling['error_estimate'])
+    self.assertEqual(set(np.argsort(-values)[:3]), set(np.argsort(-self.exact)[:3]))
+
+    # the same seed samples the same pivots, another seed other ones
+    np.testing.assert_array_equal(self.betweenness('approximate', 100)[0], values)
+    self.assertFalse(np.array_equal(self.betweenness('approximate', 100, seed=1)[0], values))
+
+  def test_target_error(self):
+    values, sampling = self.betweenness('approximate', 20, target_error=0.01)
+    # the sample is doubled from 20 pivots until the error estimate meets the target
+    self.assertIn(sampling['pivots'], (40, 80, 160, 250))
+    self.assertLessEqual(sampling['error_estimate'], 0.01)
+    self.assertGreater(self.betweenness('approximate', sampling['pivots'] / 2)[1]['error_estimate'], 0.01)
+    self.assertEqual(sampling['target_error'], 0.01)
+    self.assertLess(np.max(np.abs(values - self.exact)), 4 * sampling['error_estimate'] + 1e-12)
+
+
+if __name__ == '__main__':
+  unittest.main()
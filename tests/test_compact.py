@@ -0,0 +1,102 @@
+import os
+import sys
+import unittest
+import numpy as np
+import networkx as nx
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import compact
+from adjacency import Adjacency
+from compact import CompactReader
+from metric_calculator import MetricCalculator
+
+try:
+  import fakeredis
+except ImportError:
+  fakeredis = None
+
+
+def calculated(redis, graph):
+  # calculator whose results were published to redis
+  mc = MetricCalculator(Adjacency.from_edges(np.array(graph.edges(), dtype=np.int64)), 1, redis)
+  mc.start()
+  return mc
+
+
+class PackTest(unittest.TestCase):
+
+  def test_pack_is_little_endian(self):
+    data = compact.pack([1, 256], 'i8')
+    self.assertEqual(data, '\x01' + '\x00' * 7 + '\x00\x01' + '\x00' * 6)
+    np.testing.assert_array_equal(np.frombuffer(compact.pack([0.5, -2.25], 'float32'), dtype='<f4'), [0.5, -2.25])
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class CompactReaderTest(unittest.TestCase):
+
+  def setUp(self):
+    self.config = dict((name, getattr(config, name)) for name in ('storage_layout', 'compact_dtype', 'versioned_publishing', 'store_checkpoints'))
+    config.storage_layout       = 'compact'
+    config.versioned_publishing = False
+    config.store_checkpoints    = False
+
+    self.redis = fakeredis.FakeStrictRedis()
+    self.redis.flushall()
+    # node ids with gaps, the dense positions differ from the ids
+    self.graph = nx.relabel_nodes(nx.barabasi_albert_graph(50, 2, seed=3), lambda node: node * 3 + 7)
+    self.graph.add_edge(1000, 1001)
+
+  def tearDown(self):
+    for name, value in self.config.items():
+      setattr(config, name, value)
+
+  def test_columns_and_values(self):
+    mc     = calculated(self.redis, self.graph)
+    reader = CompactReader(self.redis, mc.compact_prefix)
+    self.assertEqual(reader.nodes.tolist(), list(mc.nodes))
+
+    names = sorted(mc.columns.names())
+    for name in names:
+      np.testing.assert_array_equal(reader.column(name), mc.columns[name], err_msg=name)
+
+    nodes = [1000, 7, 10]
+    for node, values in zip(nodes, reader.values_of(nodes, names)):
+      position = mc.nodes.index(node)
+      self.assertEqual(values, dict((name, mc.columns[name][position]) for name in names))
+    self.assertEqual(reader.value(7, 'degree'), self.graph.degree(7))
+
+  def test_neighbors(self):
+    mc     = calculated(self.redis, self.graph)
+    reader = CompactReader(self.redis, mc.compact_prefix)
+    for node in self.graph:
+      self.assertEqual(sorted(reader.neighbors(node)), sorted(self.graph.neighbors(node)))
+
+  def test_ranked_metrics_keep_sorted_sets(self):
+    mc = calculated(self.redis, self.graph)
+    for name in config.ranked_metrics:
+      ranked = dict(self.redis.zrange(mc.score_prefix+name, 0, -1, withscores=True))
+      self.assertEqual(ranked, dict((str(node), value) for node, value in zip(mc.nodes, mc.columns[name])))
+    self.assertEqual(self.redis.keys(mc.metric_prefix+'*'), [])
+
+  def test_float32_columns(self):
+    config.compact_dtype = 'float32'
+    mc     = calculated(self.redis, self.graph)
+    reader = CompactReader(self.redis, mc.compact_prefix)
+    self.assertEqual(len(self.redis.get(compact.column_key(mc.compact_prefix, 'degree'))), 4 * len(mc.nodes))
+    np.testing.assert_allclose(reader.column('betweenness_centrality'), mc.columns['betweenness_centrality'], rtol=1e-6)
+
+  def test_unknown_nodes_and_columns(self):
+    mc     = calculated(self.redis, self.graph)
+    reader = CompactReader(self.redis, mc.compact_prefix)
+    with self.assertRaises(KeyError):
+      reader.value(8, 'degree')
+    with self.assertRaises(KeyError):
+      reader.value(7, 'unknown')
+    with self.assertRaises(KeyError):
+      reader.column('unknown')
+    with self.assertRaises(ValueError):
+      CompactReader(self.redis, 'other:')
+
+
+if __name__ == '__main__':
+  unittest.main()
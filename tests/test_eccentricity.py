@@ -0,0 +1,75 @@
+import os
+import sys
+import unittest
+import numpy as np
+import networkx as nx
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+import shortest_paths
+from adjacency import Adjacency
+from metric_calculator import MetricCalculator
+
+
+def graphs():
+  # connected, disconnected (with complete, star and path components) and tree-like graphs, some with self loops
+  connected    = nx.barabasi_albert_graph(300, 2, seed=1)
+  disconnected = nx.disjoint_union_all([nx.barabasi_albert_graph(120, 1, seed=2), nx.complete_graph(4), nx.star_graph(5),
+                                        nx.path_graph(7), nx.cycle_graph(9), nx.erdos_renyi_graph(80, 0.03, seed=3)])
+  tree         = nx.random_tree(200, seed=4) if hasattr(nx, 'random_tree') else nx.balanced_tree(3, 4)
+  caterpillar  = nx.path_graph(30)
+  caterpillar.add_edges_from((i, 30 + 3 * i + j) for i in range(30) for j in range(3))
+  looped       = nx.Graph(connected)
+  looped.add_edges_from([(0, 0), (5, 5)])
+  return [connected, disconnected, tree, caterpillar, looped]
+
+
+def calculator(graph):
+  adjacency = Adjacency.from_edges(np.array(graph.edges(), dtype=np.int64).reshape(-1, 2))
+  return MetricCalculator(adjacency, 1)
+
+
+def expected(graph, nodes):
+  # eccentricities within the component of every node, without self loops
+  graph = nx.Graph(graph)
+  graph.remove_edges_from(list(nx.selfloop_edges(graph)) if hasattr(nx, 'selfloop_edges') else graph.selfloop_edges())
+  eccentricities = {}
+  for component in nx.connected_components(graph):
+    eccentricities.update(nx.eccentricity(graph.subgraph(component)))
+  return np.array([eccentricities[node] for node in nodes], dtype=np.float64)
+
+
+class BoundingEccentricityTest(unittest.TestCase):
+
+  def test_equal_to_sweep_and_networkx(self):
+    for graph in graphs():
+      for min_component_size in (64, 3):
+        mc = calculator(graph)
+        mc.bounding_min_component_size = min_component_size
+        shortest_paths.bounding_eccentricities(mc)
+        shortest_paths.sweep(mc)
+        np.testing.assert_array_equal(mc.bounded_eccentricities, mc.all_eccentricities)
+        np.testing.assert_array_equal(mc.bounded_eccentricities, expected(graph, mc.nodes))
+
+  def test_bounding_after_sweep(self):
+    # the sweep of another metric must not replace the bounding search
+    mc = calculator(graphs()[1])
+    mc.eccentricity_method = 'bounding'
+    shortest_paths.sweep(mc)
+    values = metrics.eccentricity(mc)
+    np.testing.assert_array_equal(values, mc.all_eccentricities)
+    searches = mc.writer.hashes[mc.eccentricity_bounding_key]['searches']
+    self.assertTrue(0 < searches < len(mc.nodes))
+
+  def test_checkpoint_key_of_method(self):
+    # a resumed run in another mode must not read the eccentricities (and the bounding report) of the other mode
+    mc   = calculator(graphs()[0])
+    keys = set()
+    for method, min_component_size in (('sweep', 64), ('bounding', 64), ('bounding', 3)):
+      mc.eccentricity_method          = method
+      mc.bounding_min_component_size  = min_component_size
+      keys.add(mc.checkpoint_key('eccentricity'))
+    self.assertEqual(len(keys), 3)
+
+
+if __name__ == '__main__':
+  unittest.main()
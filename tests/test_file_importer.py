@@ -0,0 +1,55 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from file_importer import FileImporter
+
+
+class FileImporterTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.cache_directory = config.graph_cache_directory
+    config.graph_cache_directory = os.path.join(self.directory, 'cache')
+
+  def tearDown(self):
+    config.graph_cache_directory = self.cache_directory
+    shutil.rmtree(self.directory)
+
+  def write(self, name, content):
+    filename = os.path.join(self.directory, name)
+    with open(filename, 'wb') as data_file:
+      data_file.write(content)
+    return filename
+
+  def test_edges(self):
+    filename  = self.write('edges.txt', b'1\t2\n2\t3\n3\t4\n4\t5\n5\t1\n')
+    adjacency = FileImporter(filename).read()
+    self.assertEqual(adjacency.nodes.tolist(), [1, 2, 3, 4, 5])
+    self.assertEqual(len(adjacency.edges()), 5)
+
+  def test_additional_numeric_fields(self):
+    filename = self.write('weighted.txt', b'1\t2\t0.5\n2\t3\t1\n')
+    self.assertEqual(FileImporter(filename).parse().tolist(), [[1, 2], [2, 3]])
+
+  def test_invalid_lines(self):
+    # fields which are not integer node ids raise an error naming the line, and nothing is cached
+    for line in (b'3\t4 # note', b'3\t4.0'):
+      filename = self.write('invalid.txt', b'1\t2\n2\t3\n' + line + b'\n4\t5\n5\t1\n')
+      with self.assertRaisesRegexp(ValueError, 'line 3'):
+        FileImporter(filename).read()
+      self.assertFalse(os.path.isdir(config.graph_cache_directory) and os.listdir(config.graph_cache_directory))
+
+  def test_invalid_line_in_later_chunk(self):
+    filename = self.write('invalid.txt', b'1\t2\n2\t3\n3\t4\n4\t5 x\n5\t1\n')
+    importer = FileImporter(filename)
+    importer.chunk_size = 8
+    with self.assertRaisesRegexp(ValueError, 'line 4'):
+      importer.parse()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import unittest
+import numpy as np
+import networkx as nx
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import shortest_paths
+from adjacency import Adjacency
+from incremental import EdgeDelta
+from metric_calculator import MetricCalculator
+
+
+def graph():
+  # small-world components (shortest paths stay local, so small changes only affect a few sources) and a binary tree,
+  # whose edges are all bridges; nodes 0-39, 40-79, ..., 160-199 and the tree 200-230
+  components = [nx.connected_watts_strogatz_graph(40, 4, 0.1, seed=seed) for seed in range(5)]
+  return nx.disjoint_union_all(components + [nx.balanced_tree(2, 4)])
+
+
+def adjacency_of(graph):
+  return Adjacency.from_edges(np.array(graph.edges(), dtype=np.int64).reshape(-1, 2))
+
+
+class IncrementalTest(unittest.TestCase):
+  # every change is applied with MetricCalculator.update's calculation (without redis) and compared with a full
+  # calculation of the changed graph
+
+  def setUp(self):
+    self.store_checkpoints = config.store_checkpoints
+    config.store_checkpoints = False
+
+    self.graph    = graph()
+    self.previous = MetricCalculator(adjacency_of(self.graph), 1)
+    self.previous.calculate()
+
+  def tearDown(self):
+    config.store_checkpoints = self.store_checkpoints
+
+  def update(self, added=(), removed=()):
+    # incremental and full calculator of the changed graph, and the number of full shortest path sweeps of the update
+    adjacency = self.previous.adjacency.with_changes(np.array(added, dtype=np.int64).reshape(-1, 2), np.array(removed, dtype=np.int64).reshape(-1, 2))
+
+    current          = MetricCalculator(adjacency, 1)
+    current.previous = self.previous
+    current.delta    = EdgeDelta(self.previous.adjacency, adjacency)
+
+    full_sweep = shortest_paths.sweep
+    sweeps     = []
+    def counted_sweep(mc):
+      sweeps.append(mc)
+      return full_sweep(mc)
+    shortest_paths.sweep = counted_sweep
+    try:
+      current.calculate()
+    finally:
+      shortest_paths.sweep = full_sweep
+
+    full = MetricCalculator(adjacency, 1)
+    full.calculate()
+    return current, full, len(sweeps)
+
+  def assert_same_columns(self, current, full):
+    self.assertEqual(current.nodes, full.nodes)
+    self.assertEqual(sorted(current.columns.names()), sorted(full.columns.names()))
+    for name in full.columns.names():
+      np.testing.assert_allclose(current.columns[name], full.columns[name], rtol=1e-9, atol=1e-12, err_msg=name)
+
+  def test_added_edges(self):
+    # shortcuts within a component and an edge to a new node
+    current, full, sweeps = self.update(added=[(3, 21), (10, 30), (45, 500)])
+    self.assertEqual(sweeps, 0)
+    self.assert_same_columns(current, full)
+
+  def test_removed_edges(self):
+    # edges within a component, which stays connected
+    removed = list(self.graph.edges(range(80, 120)))[:3]
+    changed = nx.Graph(self.graph)
+    changed.remove_edges_from(removed)
+    self.assertEqual(nx.number_connected_components(changed), nx.number_connected_components(self.graph))
+
+    current, full, sweeps = self.update(removed=removed)
+    self.assertEqual(sweeps, 0)
+    self.assert_same_columns(current, full)
+
+  def test_removed_node(self):
+    # all edges of a node are removed, which removes the node
+    current, full, sweeps = self.update(removed=list(self.graph.edges(130)))
+    self.assertNotIn(130, current.nodes)
+    self.assertEqual(sweeps, 0)
+    self.assert_same_columns(current, full)
+
+  def test_disconnecting_change(self):
+    # removing a bridge splits the tree into two components
+    current, full, sweeps = self.update(removed=[(200, 201)])
+    self.assertEqual(sweeps, 0)
+    self.assert_same_columns(current, full)
+
+  def test_connecting_change(self):
+    # an edge between two components joins them
+    current, full, sweeps = self.update(added=[(5, 215)])
+    self.assertEqual(sweeps, 0)
+    self.assert_same_columns(current, full)
+
+  def test_large_change(self):
+    # more than incremental_source_fraction of all sources are affected, everything is calculated again
+    current, full, sweeps = self.update(added=[(component * 40, 200) for component in range(5)])
+    self.assertEqual(sweeps, 1)
+    self.assert_same_columns(current, full)
+
+
+if __name__ == '__main__':
+  unittest.main()
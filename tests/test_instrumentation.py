@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import threading
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import instrumentation
+from adjacency import Adjacency
+from parallel import WorkerPool
+from redis_writer import RedisWriter
+from instrumentation import RunReport
+
+
+class Pipeline(object):
+  # records the commands sent instead of sending them
+
+  def __init__(self, sent):
+    self.sent = sent
+
+  def __getattr__(self, command):
+    return lambda *args: self.sent.append((command,) + args)
+
+  def execute(self):
+    return []
+
+class Redis(object):
+
+  def __init__(self):
+    self.sent = []
+
+  def pipeline(self, transaction=True):
+    return Pipeline(self.sent)
+
+
+def busy_chunk(adjacency, chunk):
+  total = 0
+  for i in range(chunk[0]):
+    total += i
+  return total
+
+def concurrently(*functions):
+  threads = [threading.Thread(target=function) for function in functions]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+
+
+class RunReportTest(unittest.TestCase):
+
+  def setUp(self):
+    self.writer = RedisWriter(Redis(), batch_size=2)
+    self.report = RunReport('test', 100, self.writer)
+
+  def entries(self):
+    return dict((entry['stage'], entry) for entry in self.report.stages)
+
+  def test_thread_stages_count_own_traffic(self):
+    flushed = threading.Event()
+
+    def flushing():
+      with self.report.stage('flushing', 'thread'):
+        for node in range(5):
+          self.writer.hset('node:%d' % node, 'degree', node)
+        self.writer.flush('flushing')
+        flushed.set()
+
+    def waiting():
+      with self.report.stage('waiting', 'thread'):
+        flushed.wait()
+
+    with self.report.stage('concurrent'):
+      concurrently(flushing, waiting)
+
+    entries = self.entries()
+    self.assertEqual(entries['flushing']['redis_commands'], 5)
+    self.assertEqual(entries['flushing']['redis_round_trips'], 3)
+    self.assertGreater(entries['flushing']['redis_bytes'], 0)
+    self.assertEqual(entries['waiting']['redis_commands'], 0)
+    self.assertEqual(entries['waiting']['redis_round_trips'], 0)
+    self.assertEqual(entries['waiting']['redis_bytes'], 0)
+    self.assertEqual(entries['concurrent']['redis_commands'], 5)
+    self.assertEqual(entries['concurrent']['scope'], 'process')
+    self.assertEqual(entries['waiting']['scope'], 'thread')
+
+  @unittest.skipIf(instrumentation.RUSAGE_THREAD is None, 'cpu time of threads cannot be measured')
+  def test_thread_stages_count_own_cpu_time(self):
+    def busy():
+      with self.report.stage('busy', 'thread'):
+        total = 0
+        for i in range(2000000):
+          total += i
+
+    def sleeping():
+      with self.report.stage('sleeping', 'thread'):
+        time.sleep(0.2)
+
+    with self.report.stage('concurrent'):
+      concurrently(busy, sleeping)
+
+    entries = self.entries()
+    self.assertLess(entries['sleeping']['cpu_time'], 0.05)
+    self.assertGreater(entries['busy']['cpu_time'], entries['sleeping']['cpu_time'])
+    self.assertLessEqual(entries['busy']['cpu_time'] + entries['sleeping']['cpu_time'], entries['concurrent']['cpu_time'] + 0.01)
+
+  def test_worker_cpu_time_of_stages(self):
+    pool      = WorkerPool(2)
+    adjacency = Adjacency.from_edges(np.array([[1, 2], [2, 3]], dtype=np.int64))
+    report    = RunReport('test', 3, self.writer, pool)
+    try:
+      with report.stage('calculations'):
+        with report.stage('busy', 'thread'):
+          self.assertEqual(pool.map(busy_chunk, adjacency, [[1000000], [1000000]]), [sum(range(1000000))] * 2)
+        with report.stage('idle', 'thread'):
+          pass
+    finally:
+      pool.close()
+
+    entries = dict((entry['stage'], entry) for entry in report.stages)
+    self.assertGreater(entries['busy']['worker_cpu_time'], 0)
+    self.assertEqual(entries['idle']['worker_cpu_time'], 0)
+    self.assertEqual(entries['calculations']['worker_cpu_time'], entries['busy']['worker_cpu_time'])
+    self.assertIn('process_peak_rss_mb', entries['busy'])
+    self.assertNotIn('worker_cpu_time', self.report.snapshot())
+
+
+if __name__ == '__main__':
+  unittest.main()
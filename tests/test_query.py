@@ -0,0 +1,131 @@
+import os
+import sys
+import unittest
+import numpy as np
+import networkx as nx
+from scipy.stats import rankdata
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from adjacency import Adjacency
+from metric_calculator import MetricCalculator
+from query import LRUCache, Query
+
+try:
+  import fakeredis
+except ImportError:
+  fakeredis = None
+
+
+class LRUCacheTest(unittest.TestCase):
+
+  def test_least_recently_used_entry_is_dropped(self):
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    self.assertEqual(cache.lookup('a'), 1)
+    cache.put('c', 3)
+    self.assertEqual(len(cache), 2)
+    self.assertIsNone(cache.lookup('b'))
+    self.assertEqual((cache.lookup('a'), cache.lookup('c')), (1, 3))
+
+  def test_get_computes_missing_values_once(self):
+    cache    = LRUCache(4)
+    computed = []
+    compute  = lambda: computed.append(1) or len(computed)
+    self.assertEqual(cache.get('a', compute), 1)
+    self.assertEqual(cache.get('a', compute), 1)
+    self.assertEqual(len(computed), 1)
+    # cached values which are false (e.g. None or 0) are no misses
+    cache.put('b', None)
+    self.assertIsNone(cache.get('b', compute))
+    cache.clear()
+    self.assertEqual(cache.get('a', compute), 2)
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class QueryTest(unittest.TestCase):
+
+  def setUp(self):
+    self.config = dict((name, getattr(config, name)) for name in ('storage_layout', 'versioned_publishing', 'store_checkpoints'))
+    config.store_checkpoints = False
+
+    self.redis = fakeredis.FakeStrictRedis()
+    self.redis.flushall()
+    self.graph = nx.barabasi_albert_graph(60, 2, seed=5)
+
+  def tearDown(self):
+    for name, value in self.config.items():
+      setattr(config, name, value)
+
+  def publish(self, graph):
+    mc = MetricCalculator(Adjacency.from_edges(np.array(graph.edges(), dtype=np.int64)), 1, self.redis)
+    mc.start()
+    return mc
+
+  def assert_queries(self, mc, query):
+    names = query.names()
+    self.assertIn('degree', names)
+    self.assertIn('degree'+config.normalization_suffix, names)
+    self.assertIn('unified_risk_score', names)
+
+    nodes = np.array(mc.nodes)
+    for name in ('unified_risk_score', 'degree', 'betweenness_centrality'):
+      values = mc.columns[name]
+      self.assertEqual([value for _, value in query.top(name, 5)], sorted(values.tolist(), reverse=True)[:5])
+      ranks = (rankdata(values) - 1) / (len(values) - 1)
+      for position in range(0, len(nodes), 7):
+        self.assertAlmostEqual(query.percentile_rank(int(nodes[position]), name), ranks[position], places=12)
+
+    rows = query.nodes([int(nodes[4]), int(nodes[2])], ['degree', 'eccentricity'])
+    self.assertEqual([row['node'] for row in rows], [nodes[4], nodes[2]])
+    self.assertEqual(rows[0]['values'], {'degree': mc.columns['degree'][4], 'eccentricity': mc.columns['eccentricity'][4]})
+
+    neighborhood = query.neighborhood(int(nodes[0]), ['degree'])
+    self.assertEqual([entry['node'] for entry in neighborhood['neighbors']], sorted(self.graph.neighbors(nodes[0])))
+    with self.assertRaises(KeyError):
+      query.nodes([10 ** 9])
+
+  def test_classic_layout(self):
+    config.storage_layout, config.versioned_publishing = 'classic', False
+    mc = self.publish(self.graph)
+    self.assert_queries(mc, Query(self.redis, check_interval=0))
+
+  def test_compact_layout(self):
+    config.storage_layout, config.versioned_publishing = 'compact', True
+    mc = self.publish(self.graph)
+    self.assert_queries(mc, Query(self.redis, check_interval=0))
+
+  def test_cache_is_cleared_when_another_run_is_published(self):
+    config.storage_layout, config.versioned_publishing = 'classic', True
+    self.publish(self.graph)
+    query    = Query(self.redis, check_interval=0)
+    node     = max(self.graph, key=self.graph.degree)
+    degree   = query.nodes([node], ['degree'])[0]['values']['degree']
+    self.assertEqual(query.top('degree', 1), [[node, degree]])
+    cached   = len(query.cache)
+
+    # results are served from the cache until the next run is published
+    self.redis.zadd(query.metric_prefix+'degree', 1000, '0')
+    self.assertEqual(query.top('degree', 1), [[node, degree]])
+    self.assertEqual(len(query.cache), cached)
+
+    changed = nx.Graph(self.graph)
+    changed.add_edges_from((node, other) for other in range(60, 70))
+    self.publish(changed)
+    self.assertEqual(query.top('degree', 1), [[node, degree + 10]])
+    self.assertEqual(query.nodes([node], ['degree'])[0]['values']['degree'], degree + 10)
+
+  def test_check_interval(self):
+    config.storage_layout, config.versioned_publishing = 'classic', True
+    self.publish(self.graph)
+    query = Query(self.redis, check_interval=3600)
+    top   = query.top('degree', 1)
+    self.publish(nx.path_graph(5))
+    # the new run is noticed at the next check only
+    self.assertEqual(query.top('degree', 1), top)
+    query.checked = None
+    self.assertEqual(query.top('degree', 1)[0][1], 2)
+
+
+if __name__ == '__main__':
+  unittest.main()
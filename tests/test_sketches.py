@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import unittest
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sketches
+from sketches import Summary
+
+
+def exact_quantile(values, q):
+  # value of rank q * (count - 1), like Summary.quantile
+  return np.sort(values)[int(q * (len(values) - 1))]
+
+
+class SummaryTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(1)
+    self.integers = rng.randint(1, 8, 400).astype(np.float64)
+    self.reals    = np.concatenate((rng.lognormal(size=5000), -rng.lognormal(size=2000), np.zeros(30)))
+    rng.shuffle(self.reals)
+
+  def test_moments(self):
+    summary = sketches.summarize(self.reals, 700)
+    self.assertEqual(summary.count, len(self.reals))
+    self.assertEqual(summary.min, self.reals.min())
+    self.assertEqual(summary.max, self.reals.max())
+    self.assertAlmostEqual(summary.mean, np.mean(self.reals), places=10)
+    self.assertAlmostEqual(summary.standard_deviation(), np.std(self.reals), places=10)
+
+  def test_quantiles_within_relative_accuracy(self):
+    summary = sketches.summarize(self.reals, 700, 0.01)
+    values  = set(self.reals.tolist())
+    for q in np.linspace(0.0, 1.0, 201):
+      exact = exact_quantile(self.reals, q)
+      value = summary.quantile(q)
+      self.assertIn(value, values)
+      self.assertLessEqual(abs(value - exact), 0.01 * abs(exact))
+
+  def test_quantiles_of_integers(self):
+    summary = sketches.summarize(self.integers, 64)
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+      self.assertEqual(summary.quantile(q), exact_quantile(self.integers, q))
+
+  def test_histogram_of_integers(self):
+    # integer values on bin edges are counted into the bin they start
+    summary = sketches.summarize(self.integers, 64)
+    edges, counts = summary.histogram(20)
+    expected_counts, expected_edges = np.histogram(self.integers, bins=20, range=(self.integers.min(), self.integers.max()))
+    np.testing.assert_array_equal(edges, expected_edges)
+    np.testing.assert_array_equal(counts, expected_counts)
+
+  def test_histogram_of_reals(self):
+    summary = sketches.summarize(self.reals, 700, bins=15)
+    edges, counts = summary.histogram(15)
+    np.testing.assert_array_equal(counts, np.histogram(self.reals, bins=edges)[0])
+
+  def test_merge(self):
+    # summaries of parts merge into the summary of the whole
+    whole  = sketches.summarize(self.reals, 1000)
+    merged = Summary(whole.relative_accuracy)
+    for part in np.array_split(self.reals, 7):
+      merged.merge(sketches.summarize(part, 1000))
+
+    self.assertEqual(merged.count, whole.count)
+    self.assertEqual((merged.min, merged.max, merged.zeros), (whole.min, whole.max, whole.zeros))
+    self.assertAlmostEqual(merged.mean, whole.mean, places=10)
+    self.assertAlmostEqual(merged.m2, whole.m2, places=6)
+    self.assertEqual(merged.positive, whole.positive)
+    self.assertEqual(merged.negative, whole.negative)
+    for q in np.linspace(0.0, 1.0, 51):
+      self.assertEqual(merged.quantile(q), whole.quantile(q))
+
+  def test_merge_different_accuracies(self):
+    with self.assertRaises(ValueError):
+      Summary(0.01).merge(sketches.summarize(self.reals, 1000, 0.02))
+
+  def test_round_trip(self):
+    summary  = sketches.summarize(self.reals, 700)
+    restored = Summary.from_dict(json.loads(json.dumps(summary.as_dict())))
+    for q in np.linspace(0.0, 1.0, 51):
+      self.assertEqual(restored.quantile(q), summary.quantile(q))
+    np.testing.assert_array_equal(restored.histogram(20)[1], summary.histogram(20)[1])
+
+  def test_empty(self):
+    summary = sketches.summarize(np.zeros(0))
+    self.assertEqual(summary.count, 0)
+    with self.assertRaises(ValueError):
+      summary.quantile(0.5)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import unittest
+import numpy as np
+import networkx as nx
+import redis as rd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import versions
+from adjacency import Adjacency
+from metric_calculator import MetricCalculator
+from rescore import Rescorer
+
+try:
+  import fakeredis
+except ImportError:
+  fakeredis = None
+
+
+def test_redis():
+  # in-memory redis without UNLINK, like redis before 4.0 (versions.unlink falls back to DEL)
+  class TestRedis(fakeredis.FakeStrictRedis):
+    def execute_command(self, *args):
+      raise rd.ResponseError('unknown command %s' % args[0])
+  redis = TestRedis()
+  redis.flushall()
+  return redis
+
+
+def contents(redis, namespace):
+  # all keys below a namespace (without it) with their values
+  values = {}
+  for key in redis.keys(namespace+'*'):
+    key_type = redis.type(key)
+    if key_type == 'hash':
+      value = redis.hgetall(key)
+    elif key_type == 'zset':
+      value = redis.zrange(key, 0, -1, withscores=True)
+    elif key_type == 'set':
+      value = sorted(redis.smembers(key))
+    else:
+      value = redis.get(key)
+    values[key[len(namespace):]] = value
+  return values
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class VersionsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.redis  = test_redis()
+    self.config = dict((name, getattr(config, name)) for name in ('versioned_publishing', 'keep_versions', 'abandoned_run_age', 'store_checkpoints'))
+    config.versioned_publishing = True
+    config.store_checkpoints    = False
+
+  def tearDown(self):
+    for name, value in self.config.items():
+      setattr(config, name, value)
+
+  def publish(self, run_id):
+    versions.register(self.redis, run_id)
+    self.redis.set(versions.namespace(run_id)+'key', run_id)
+    versions.activate(self.redis, run_id)
+
+  def test_cleanup_keeps_latest_versions(self):
+    for run_id in ('a', 'b', 'c', 'd'):
+      self.publish(run_id)
+    self.assertEqual(versions.cleanup(self.redis, keep=1), ['a', 'b'])
+    self.assertEqual(sorted(self.redis.keys('run:*')), ['run:c:key', 'run:d:key'])
+    self.assertEqual(self.redis.zrange(config.versions_key, 0, -1), ['c', 'd'])
+    self.assertEqual(self.redis.get(config.live_run_key), 'd')
+
+  def test_cleanup_reads_config_when_called(self):
+    for run_id in ('a', 'b', 'c'):
+      self.publish(run_id)
+    config.keep_versions = 0
+    self.assertEqual(versions.cleanup(self.redis), ['a', 'b'])
+    self.assertEqual(self.redis.keys('run:*'), ['run:c:key'])
+
+  def test_cleanup_of_abandoned_runs(self):
+    # runs which never published are deleted once they are older than abandoned_run_age, later ones may still run
+    self.publish('live')
+    self.redis.zadd(config.runs_key, time.time() - 3600, 'abandoned')
+    self.redis.set('run:abandoned:key', 1)
+    versions.register(self.redis, 'running')
+    self.redis.set('run:running:key', 1)
+
+    config.abandoned_run_age = 600
+    self.assertEqual(versions.cleanup(self.redis), ['abandoned'])
+    self.assertEqual(sorted(self.redis.keys('run:*')), ['run:live:key', 'run:running:key'])
+
+  def test_activate_replacing(self):
+    self.publish('a')
+    versions.activate(self.redis, 'b', replaces='a')
+    self.assertEqual(self.redis.get(config.live_run_key), 'b')
+    with self.assertRaises(ValueError):
+      versions.activate(self.redis, 'c', replaces='a')
+    self.assertEqual(self.redis.get(config.live_run_key), 'b')
+
+  def test_copy_namespace(self):
+    self.redis.hmset('run:a:hash', {'x': 1, 'y': 2})
+    self.redis.zadd('run:a:zset', 1.5, 'm', 2.5, 'n')
+    self.redis.sadd('run:a:set', 'p', 'q', 'r')
+    self.redis.set('run:a:string', '')
+    self.redis.set('run:ab:other', 1)
+    versions.copy_namespace(self.redis, 'run:a:', 'run:b:', 2)
+    self.assertEqual(contents(self.redis, 'run:b:'), contents(self.redis, 'run:a:'))
+    self.assertEqual(sorted(contents(self.redis, 'run:b:')), ['hash', 'set', 'string', 'zset'])
+
+  def test_rescore_publishes_new_version(self):
+    graph   = nx.barabasi_albert_graph(60, 2, seed=1)
+    mc      = MetricCalculator(Adjacency.from_edges(np.array(graph.edges(), dtype=np.int64)), 1, self.redis)
+    mc.start()
+    before  = contents(self.redis, mc.namespace)
+
+    rescorer = Rescorer({'alternative': {'degree': 1.0}}, self.redis)
+    self.assertNotEqual(rescorer.namespace, mc.namespace)
+    rescorer.start()
+
+    live  = versions.live_namespace(self.redis)
+    after = contents(self.redis, live)
+    self.assertEqual(live, rescorer.namespace)
+    self.assertEqual(self.redis.get(config.published_run_key), rescorer.run_id)
+    # the previous version is unchanged, the new one has all its keys and the new score
+    self.assertEqual(contents(self.redis, mc.namespace), before)
+    self.assertTrue(set(before) < set(after))
+    self.assertIn('alternative', self.redis.smembers(live+config.score_index_key))
+    degrees = dict(self.redis.zrange(live+config.metric_prefix+'degree'+config.normalization_suffix, 0, -1, withscores=True))
+    scores  = dict(self.redis.zrange(live+config.score_prefix+'alternative', 0, -1, withscores=True))
+    self.assertEqual(scores, degrees)
+
+
+if __name__ == '__main__':
+  unittest.main()
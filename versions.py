@@ -0,0 +1,137 @@
+#versions.py
+import time
+import redis as rd
+import config
+
+# versioned publishing (versioned_publishing in config.py)
+# instead of flushing the database, every run writes all its keys below its own namespace
+#   <run_namespace_prefix><run id>:<key>
+# so readers keep seeing the complete results of the live run while another run calculates and publishes
+# a finished run is made live by switching the pointer under live_run_key to its id in one transaction,
+# afterwards the namespaces of older versions are deleted with SCAN and the non-blocking UNLINK
+# started runs are recorded in the sorted set runs_key (scored by start time) before they write anything,
+# published versions in versions_key (scored by publish time)
+# rescore.py publishes a new version as well: a copy of the live run with the rescored columns, made live the same way
+
+def namespace(run_id):
+  return config.run_namespace_prefix+run_id+':'
+
+def live_namespace(redis):
+  # namespace of the live run, the empty namespace without versioned publishing or before the first versioned run
+  if not config.versioned_publishing:
+    return ''
+  run_id = redis.get(config.live_run_key)
+  return namespace(run_id) if run_id is not None else ''
+
+
+def register(redis, run_id):
+  # called before the run writes any key, so that the keys of a run which never finishes are found by cleanup
+  redis.zadd(config.runs_key, time.time(), run_id)
+
+def activate(redis, run_id, replaces=None):
+  # makes the run live, readers switch to it on their next read of the pointer
+  # with replaces, the run is only made live if the run replaces is still live (e.g. the run a rescored version was
+  # copied from, see rescore.py), so that a newer run is never replaced by an older one
+  pipe = redis.pipeline(transaction=True)
+  if replaces is not None:
+    pipe.watch(config.live_run_key)
+    live = pipe.get(config.live_run_key)
+    if live != replaces:
+      pipe.reset()
+      raise ValueError('run %s cannot replace run %s, run %s is live' % (run_id, replaces, live))
+    pipe.multi()
+  pipe.set(config.live_run_key, run_id)
+  pipe.set(config.published_run_key, run_id)
+  pipe.zadd(config.versions_key, time.time(), run_id)
+  pipe.execute()
+
+
+def cleanup(redis, keep=None, abandoned_age=None, batch_size=None):
+  # deletes all versions published before the live run except the keep latest ones, and all runs which started more
+  # than abandoned_age seconds ago without being published; runs started later may still be calculating and are kept
+  # unset arguments are read from config (keep_versions, abandoned_run_age, redis_batch_size) when cleanup is called
+  # returns the ids of the deleted runs
+  keep          = config.keep_versions if keep is None else keep
+  abandoned_age = config.abandoned_run_age if abandoned_age is None else abandoned_age
+  batch_size    = config.redis_batch_size if batch_size is None else batch_size
+
+  live = redis.get(config.live_run_key)
+  if live is None:
+    return []
+
+  published = [run_id for run_id in redis.zrange(config.versions_key, 0, -1) if run_id != live]
+  published = published[:max(0, len(published) - keep)]
+  published_runs = set(redis.zrange(config.versions_key, 0, -1))
+  abandoned = [run_id for run_id in redis.zrangebyscore(config.runs_key, '-inf', time.time() - abandoned_age)
+               if run_id not in published_runs]
+
+  for run_id in published + abandoned:
+    delete_namespace(redis, namespace(run_id), batch_size)
+    pipe = redis.pipeline(transaction=False)
+    pipe.zrem(config.runs_key, run_id)
+    pipe.zrem(config.versions_key, run_id)
+    pipe.execute()
+  return published + abandoned
+
+def copy_namespace(redis, source, target, batch_size):
+  # copies all keys below the namespace source to the namespace target, batch_size keys per round trip
+  # a new version made from the live run (see rescore.py) is complete before it is changed and made live
+  keys = []
+  for key in redis.scan_iter(match=source+'*', count=batch_size):
+    keys.append(key)
+    if len(keys) == batch_size:
+      copy_keys(redis, keys, source, target, batch_size)
+      keys = []
+  if keys:
+    copy_keys(redis, keys, source, target, batch_size)
+
+def copy_keys(redis, keys, source, target, batch_size):
+  # hashes, sorted sets, sets and strings (all types written by RedisWriter) are read and written with the commands of
+  # their type, which every redis version supports
+  pipe = redis.pipeline(transaction=False)
+  for key in keys:
+    pipe.type(key)
+  types   = pipe.execute()
+  readers = {'hash'  : pipe.hgetall,
+             'zset'  : lambda key: pipe.zrange(key, 0, -1, withscores=True),
+             'set'   : lambda key: pipe.smembers(key),
+             'string': pipe.get}
+  keys    = [(key, key_type) for key, key_type in zip(keys, types) if key_type in readers]
+  for key, key_type in keys:
+    readers[key_type](key)
+
+  for (key, key_type), value in zip(keys, pipe.execute()):
+    copy = target+key[len(source):]
+    # keys deleted since the scan are not copied
+    if value is None or (key_type != 'string' and not value):
+      continue
+    if key_type == 'hash':
+      pipe.hmset(copy, value)
+    elif key_type == 'zset':
+      for i in range(0, len(value), batch_size):
+        pipe.zadd(copy, *[argument for member, score in value[i:i + batch_size] for argument in (score, member)])
+    elif key_type == 'set':
+      members = sorted(value)
+      for i in range(0, len(members), batch_size):
+        pipe.sadd(copy, *members[i:i + batch_size])
+    else:
+      pipe.set(copy, value)
+  pipe.execute()
+
+def delete_namespace(redis, prefix, batch_size):
+  # SCAN returns every key which exists for the whole scan, deleting keys in between does not make it miss any
+  keys = []
+  for key in redis.scan_iter(match=prefix+'*', count=batch_size):
+    keys.append(key)
+    if len(keys) == batch_size:
+      unlink(redis, keys)
+      keys = []
+  if keys:
+    unlink(redis, keys)
+
+def unlink(redis, keys):
+  # UNLINK (redis 4.0 and later) frees the memory of the keys in a background thread of redis, DEL is used otherwise
+  try:
+    redis.execute_command('UNLINK', *keys)
+  except rd.ResponseError:
+    redis.delete(*keys)